@@ -0,0 +1,54 @@
+from django.urls import path
+from . import views
+
+# Mounted under api/ by appointment/urls.py
+urlpatterns = (
+    path('appointments/<int:appointment_id>/update-status/', 
+         views.update_appointment_status, 
+         name='update_appointment_status'),
+    
+    path('appointments/<int:appointment_id>/details/', 
+         views.get_appointment_details, 
+         name='get_appointment_details'),
+    
+    path('appointments/available-slots/', 
+         views.get_available_slots, 
+         name='get_available_slots'),
+    
+    path('appointments/available-slots-v2/', 
+         views.get_available_slots_v2, 
+         name='get_available_slots_v2'),
+    
+    path('appointments/bulk-update/', 
+         views.bulk_update_appointments, 
+         name='bulk_update_appointments'),
+    
+    path('appointments/export/', 
+         views.export_appointments, 
+         name='export_appointments'),
+    
+    path('analytics/dashboard/', 
+         views.analytics_dashboard, 
+         name='analytics_dashboard'),
+    
+    path('notifications/<int:notification_id>/mark-read/', 
+         views.mark_notification_read, 
+         name='mark_notification_read'),
+    
+    path('notifications/mark-all-read/', 
+         views.mark_all_notifications_read, 
+         name='mark_all_notifications_read'),
+    
+    path('search/appointments/', 
+         views.search_appointments, 
+         name='search_appointments'),
+    
+    path('calendar/events/', 
+         views.calendar_events, 
+         name='calendar_events'),
+    
+    # Review endpoints
+    path('doctors/<int:doctor_id>/add-review/', 
+         views.add_review, 
+         name='add_review'),
+)
@@ -0,0 +1,23 @@
+from django.core.cache import cache
+
+from .signals import UNREAD_NOTIFICATIONS_CACHE_KEY
+
+
+def notifications(request):
+    """
+    Unread notification count for the navbar, computed at most once per
+    request and cached per user between requests. The signals clear the
+    cached value whenever the user's notifications change.
+    """
+    if not request.user.is_authenticated:
+        return {'unread_notifications': 0}
+    unread = getattr(request, '_unread_notifications', None)
+    if unread is None:
+        user = request.user
+        unread = cache.get_or_set(
+            UNREAD_NOTIFICATIONS_CACHE_KEY.format(user.pk),
+            lambda: user.notifications.filter(is_read=False).count(),
+            60,
+        )
+        request._unread_notifications = unread
+    return {'unread_notifications': unread}
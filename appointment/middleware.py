@@ -0,0 +1,25 @@
+from django.contrib.auth import BACKEND_SESSION_KEY
+
+PROFILE_BACKEND = 'appointment.backends.ProfileModelBackend'
+LEGACY_BACKEND = 'django.contrib.auth.backends.ModelBackend'
+
+
+class ProfileMiddleware:
+    """
+    Make request.user arrive with its Profile (and Doctor) already loaded.
+
+    Sessions created before ProfileModelBackend was added still name the
+    stock ModelBackend, which loads the bare user. They are pointed at
+    ProfileModelBackend here, before the lazy request.user is first
+    evaluated, so every authenticated request loads the user and profile in
+    one query instead of a separate profile SELECT per view.
+    Must come right after AuthenticationMiddleware.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        if request.session.get(BACKEND_SESSION_KEY) == LEGACY_BACKEND:
+            request.session[BACKEND_SESSION_KEY] = PROFILE_BACKEND
+        return self.get_response(request)
@@ -0,0 +1,21 @@
+# Generated by Django 5.2.18 on 2026-10-14 09:12
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("appointment", "0009_doctor_user"),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="appointmentreminder",
+            index=models.Index(
+                condition=models.Q(("is_sent", False)),
+                fields=["is_sent", "scheduled_for"],
+                name="reminder_due_idx",
+            ),
+        ),
+    ]
@@ -0,0 +1,33 @@
+# Generated by Django 5.2.18 on 2026-10-14 09:40
+
+import appointment.models
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("appointment", "0010_appointmentreminder_reminder_due_idx"),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="appointment",
+            name="appointment_at",
+            field=models.GeneratedField(
+                db_persist=True,
+                expression=appointment.models.AppointmentDateTime(
+                    models.F("appointment_date"), models.F("appointment_time")
+                ),
+                output_field=models.DateTimeField(),
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="appointment",
+            index=models.Index(
+                fields=["appointment_at"], name="appointment_appoint_d01165_idx"
+            ),
+        ),
+    ]
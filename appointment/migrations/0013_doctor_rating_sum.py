@@ -0,0 +1,38 @@
+from django.db import migrations, models
+from django.db.models import Count, Sum
+
+
+def backfill_rating_sum(apps, schema_editor):
+    Doctor = apps.get_model("appointment", "Doctor")
+    Review = apps.get_model("appointment", "Review")
+    stats = {
+        row["doctor_id"]: row
+        for row in Review.objects.filter(is_approved=True)
+        .values("doctor_id")
+        .annotate(rating_sum=Sum("rating"), total=Count("id"))
+    }
+    doctors = list(Doctor.objects.filter(pk__in=stats))
+    for doctor in doctors:
+        row = stats[doctor.pk]
+        doctor.rating_sum = row["rating_sum"]
+        doctor.total_reviews = row["total"]
+        doctor.average_rating = round(row["rating_sum"] / row["total"], 2)
+    Doctor.objects.bulk_update(
+        doctors, ["rating_sum", "total_reviews", "average_rating"], batch_size=1000
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("appointment", "0011_appointment_appointment_at_and_more"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="doctor",
+            name="rating_sum",
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.RunPython(backfill_rating_sum, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,36 @@
+from django.conf import settings
+from django.db import migrations
+
+
+def link_doctors_to_users(apps, schema_editor):
+    """Link legacy doctors to the user account whose username matches their name"""
+    Doctor = apps.get_model("appointment", "Doctor")
+    User = apps.get_model(*settings.AUTH_USER_MODEL.split("."))
+    linked = set(
+        Doctor.objects.filter(user__isnull=False).values_list("user_id", flat=True)
+    )
+    doctors = list(Doctor.objects.filter(user__isnull=True))
+    users = {
+        user.username: user.pk
+        for user in User.objects.filter(username__in=[d.name for d in doctors])
+    }
+    to_update = []
+    for doctor in doctors:
+        user_id = users.get(doctor.name)
+        if user_id and user_id not in linked:
+            doctor.user_id = user_id
+            linked.add(user_id)
+            to_update.append(doctor)
+    Doctor.objects.bulk_update(to_update, ["user"], batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("appointment", "0013_doctor_rating_sum"),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.RunPython(link_doctors_to_users, migrations.RunPython.noop),
+    ]
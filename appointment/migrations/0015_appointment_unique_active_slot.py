@@ -0,0 +1,63 @@
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import Count
+
+ACTIVE_STATUSES = ["pending", "approved", "scheduled", "rescheduled"]
+
+
+def cancel_duplicate_bookings(apps, schema_editor):
+    """
+    Keep the earliest active booking of each doctor slot and cancel the
+    rest, which the old check-then-insert race could create; otherwise the
+    unique constraint below cannot be added.
+    """
+    Appointment = apps.get_model("appointment", "Appointment")
+    StatusHistory = apps.get_model("appointment", "StatusHistory")
+    active = Appointment.objects.filter(status__in=ACTIVE_STATUSES)
+    clashes = (
+        active.values("doctor_id", "appointment_date", "appointment_time")
+        .annotate(n=Count("id"))
+        .filter(n__gt=1)
+        .order_by()
+    )
+    reason = "Cancelled automatically: another booking already held this slot"
+    for slot in clashes:
+        duplicates = list(
+            active.filter(
+                doctor_id=slot["doctor_id"],
+                appointment_date=slot["appointment_date"],
+                appointment_time=slot["appointment_time"],
+            ).order_by("created_at", "pk")[1:]
+        )
+        StatusHistory.objects.bulk_create(
+            StatusHistory(
+                appointment=appointment,
+                old_status=appointment.status,
+                new_status="cancelled",
+                reason=reason,
+            )
+            for appointment in duplicates
+        )
+        Appointment.objects.filter(pk__in=[a.pk for a in duplicates]).update(
+            status="cancelled", cancellation_reason=reason
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("appointment", "0014_backfill_doctor_user"),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.RunPython(cancel_duplicate_bookings, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name="appointment",
+            constraint=models.UniqueConstraint(
+                condition=models.Q(("status__in", ACTIVE_STATUSES)),
+                fields=("doctor", "appointment_date", "appointment_time"),
+                name="unique_active_slot",
+            ),
+        ),
+    ]
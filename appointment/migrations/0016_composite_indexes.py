@@ -0,0 +1,49 @@
+# Generated by Django 5.2.18 on 2026-10-14 12:40
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("appointment", "0015_appointment_unique_active_slot"),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name="appointment",
+            name="appointment_status_4a1f55_idx",
+        ),
+        migrations.RemoveIndex(
+            model_name="appointment",
+            name="appointment_doctor__e869d6_idx",
+        ),
+        migrations.AddIndex(
+            model_name="appointment",
+            index=models.Index(
+                fields=["status", "appointment_date"],
+                name="appointment_status_8bf851_idx",
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="appointment",
+            index=models.Index(
+                fields=["doctor", "appointment_date", "appointment_time", "status"],
+                name="appointment_doctor__8377fd_idx",
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="appointment",
+            index=models.Index(
+                fields=["user", "-created_at"], name="appointment_user_id_91c2e8_idx"
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="notification",
+            index=models.Index(
+                fields=["user", "is_read"], name="appointment_user_id_f871a6_idx"
+            ),
+        ),
+    ]
@@ -0,0 +1,36 @@
+from django.db import migrations
+
+INDEX_NAME = "doctor_search_idx"
+
+
+def search_index():
+    from django.contrib.postgres.indexes import GinIndex
+    from django.contrib.postgres.search import SearchVector
+
+    # Same expression as views.search_doctors, so the planner can use it
+    return GinIndex(
+        SearchVector("name", "specialization", config="simple"), name=INDEX_NAME
+    )
+
+
+def add_search_index(apps, schema_editor):
+    if schema_editor.connection.vendor != "postgresql":
+        return
+    schema_editor.add_index(apps.get_model("appointment", "Doctor"), search_index())
+
+
+def remove_search_index(apps, schema_editor):
+    if schema_editor.connection.vendor != "postgresql":
+        return
+    schema_editor.remove_index(apps.get_model("appointment", "Doctor"), search_index())
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("appointment", "0016_composite_indexes"),
+    ]
+
+    operations = [
+        migrations.RunPython(add_search_index, remove_search_index),
+    ]
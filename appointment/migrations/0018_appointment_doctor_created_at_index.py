@@ -0,0 +1,21 @@
+# Generated by Django 5.2.18 on 2026-10-14 13:55
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("appointment", "0017_doctor_search_index"),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="appointment",
+            index=models.Index(
+                fields=["doctor", "created_at"], name="appointment_doctor__c3891a_idx"
+            ),
+        ),
+    ]
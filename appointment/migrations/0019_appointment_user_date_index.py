@@ -0,0 +1,22 @@
+# Generated by Django 5.2.18 on 2026-10-14 14:10
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("appointment", "0018_appointment_doctor_created_at_index"),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="appointment",
+            index=models.Index(
+                fields=["user", "appointment_date", "appointment_time"],
+                name="appointment_user_id_98e181_idx",
+            ),
+        ),
+    ]
@@ -0,0 +1,25 @@
+# Generated by Django 5.2.18 on 2026-10-14 14:25
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("appointment", "0019_appointment_user_date_index"),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name="appointmentreminder",
+            name="reminder_due_idx",
+        ),
+        migrations.AddIndex(
+            model_name="appointmentreminder",
+            index=models.Index(
+                condition=models.Q(("is_sent", False)),
+                fields=["scheduled_for"],
+                name="reminder_due_idx",
+            ),
+        ),
+    ]
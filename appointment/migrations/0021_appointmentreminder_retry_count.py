@@ -0,0 +1,18 @@
+# Generated by Django 5.2.18 on 2026-10-14 14:40
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("appointment", "0020_reminder_due_index_scheduled_for"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="appointmentreminder",
+            name="retry_count",
+            field=models.PositiveSmallIntegerField(default=0),
+        ),
+    ]
@@ -4,6 +4,30 @@ from django.utils import timezone
 from django.conf import settings
 
 
+class AppointmentDateTime(models.Func):
+    """
+    Combine a date column and a time column into a single UTC timestamp.
+    Renders backend-specific SQL so it can back a stored GeneratedField.
+    """
+    function = 'TIMESTAMP'
+    arity = 2
+    output_field = models.DateTimeField()
+
+    def as_sqlite(self, compiler, connection, **extra_context):
+        return self.as_sql(
+            compiler, connection,
+            template="datetime(%(expressions)s)", arg_joiner=" || ' ' || ",
+            **extra_context
+        )
+
+    def as_postgresql(self, compiler, connection, **extra_context):
+        return self.as_sql(
+            compiler, connection,
+            template="((%(expressions)s) AT TIME ZONE 'UTC')", arg_joiner=" + ",
+            **extra_context
+        )
+
+
 class Doctor(models.Model):
     # Link to User account (proper relationship instead of name matching)
     user = models.OneToOneField(
@@ -32,27 +56,79 @@ class Doctor(models.Model):
     # Review & Rating fields (denormalized for performance)
     average_rating = models.DecimalField(max_digits=3, decimal_places=2, default=0)
     total_reviews = models.PositiveIntegerField(default=0)
+    rating_sum = models.PositiveIntegerField(default=0)
 
     def __str__(self):
         return self.name
 
-    def update_rating(self):
-        """Update the average rating and total reviews count"""
-        from django.db.models import Avg
-        reviews = self.reviews.filter(is_approved=True)
-        avg = reviews.aggregate(avg_rating=Avg('rating'))['avg_rating']
-        self.average_rating = round(avg, 2) if avg else 0
-        self.total_reviews = reviews.count()
-        self.save(update_fields=['average_rating', 'total_reviews'])
+    @staticmethod
+    def _average_rating(rating_sum, total_reviews):
+        """
+        ROUND(rating_sum / total_reviews, 2) as an SQL expression. The
+        division is done in floating point so SQLite doesn't truncate it, and
+        the quotient is cast to numeric because PostgreSQL only has
+        ROUND(numeric, integer).
+        """
+        from django.db.models import DecimalField, FloatField
+        from django.db.models.functions import Cast, Round
+        return Round(
+            Cast(
+                Cast(rating_sum, FloatField()) / total_reviews,
+                DecimalField(max_digits=5, decimal_places=2),
+            ),
+            2,
+        )
+
+    @classmethod
+    def increment_rating(cls, doctor_id, new_rating):
+        """Fold one newly approved rating into the stored counters"""
+        from django.db.models import F
+        cls.objects.filter(pk=doctor_id).update(
+            rating_sum=F('rating_sum') + new_rating,
+            total_reviews=F('total_reviews') + 1,
+            average_rating=cls._average_rating(
+                F('rating_sum') + new_rating, F('total_reviews') + 1
+            ),
+        )
+
+    @classmethod
+    def decrement_rating(cls, doctor_id, old_rating):
+        """Take one previously approved rating back out of the stored counters"""
+        from decimal import Decimal
+        from django.db.models import Case, DecimalField, F, Value, When
+        cls.objects.filter(pk=doctor_id, total_reviews__gt=0).update(
+            rating_sum=F('rating_sum') - old_rating,
+            total_reviews=F('total_reviews') - 1,
+            average_rating=Case(
+                When(total_reviews__lte=1, then=Value(Decimal('0.00'))),
+                default=cls._average_rating(
+                    F('rating_sum') - old_rating, F('total_reviews') - 1
+                ),
+                output_field=DecimalField(max_digits=5, decimal_places=2),
+            ),
+        )
 
     def get_rating_display(self):
         """Return a formatted rating string with stars"""
-        return f"{self.average_rating} ({self.total_reviews} reviews)"
+        return f"{self.average_rating:.2f} ({self.total_reviews} reviews)"
 
     class Meta:
         ordering = ['name']
 
 
+class AppointmentQuerySet(models.QuerySet):
+    def with_signal_context(self):
+        """
+        Load the relations the save signals and email tasks read
+        (doctor name/specialization, the patient's profile) in the same query.
+        """
+        return self.select_related('doctor', 'user__profile')
+
+
+# Statuses that hold a doctor's slot; a rescheduled appointment keeps its new one
+ACTIVE_STATUSES = ['pending', 'approved', 'scheduled', 'rescheduled']
+
+
 class Appointment(models.Model):
     STATUS_CHOICES = (
         ('pending', 'Pending'),
@@ -81,6 +157,12 @@ class Appointment(models.Model):
     doctor = models.ForeignKey(Doctor, on_delete=models.CASCADE)
     appointment_date = models.DateField()
     appointment_time = models.TimeField()
+    # Date and time combined by the database, for filtering and ordering
+    appointment_at = models.GeneratedField(
+        expression=AppointmentDateTime(models.F('appointment_date'), models.F('appointment_time')),
+        output_field=models.DateTimeField(),
+        db_persist=True,
+    )
     
     # Status and Tracking
     status = models.CharField(
@@ -108,24 +190,44 @@ class Appointment(models.Model):
     # User (if authenticated)
     user = models.ForeignKey(User, on_delete=models.SET_NULL, null=True, blank=True)
 
+    objects = AppointmentQuerySet.as_manager()
+
     def __str__(self):
         return f"{self.patient_name} - {self.doctor.name} ({self.status})"
 
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # Remember the stored status so the pre_save signal needn't re-read it
+        if 'status' in instance.__dict__:
+            instance._loaded_status = instance.status
+        return instance
+
     class Meta:
         ordering = ['-created_at']
         indexes = [
-            models.Index(fields=['status']),
-            models.Index(fields=['doctor', 'appointment_date']),
+            # Composite keys matching the view filters; their leading columns
+            # also serve the status-only and doctor/date lookups
+            models.Index(fields=['status', 'appointment_date']),
+            models.Index(fields=['doctor', 'appointment_date', 'appointment_time', 'status']),
             models.Index(fields=['user', 'status']),
+            models.Index(fields=['user', 'appointment_date', 'appointment_time']),
+            models.Index(fields=['user', '-created_at']),
+            models.Index(fields=['doctor', 'created_at']),
+            models.Index(fields=['appointment_at']),
+        ]
+        constraints = [
+            # A doctor's slot can hold only one active appointment
+            models.UniqueConstraint(
+                fields=['doctor', 'appointment_date', 'appointment_time'],
+                condition=models.Q(status__in=ACTIVE_STATUSES),
+                name='unique_active_slot',
+            ),
         ]
 
     def is_upcoming(self):
         """Check if appointment is in the future"""
-        now = timezone.now()
-        appointment_datetime = timezone.make_aware(
-            timezone.datetime.combine(self.appointment_date, self.appointment_time)
-        )
-        return appointment_datetime > now
+        return self.appointment_at > timezone.now()
 
     def is_past(self):
         """Check if appointment is in the past"""
@@ -133,11 +235,11 @@ class Appointment(models.Model):
 
     def can_be_cancelled(self):
         """Check if appointment can be cancelled"""
-        return self.status in ['pending', 'approved', 'scheduled']
+        return self.status in ACTIVE_STATUSES
 
     def can_be_rescheduled(self):
         """Check if appointment can be rescheduled"""
-        return self.status in ['pending', 'approved', 'scheduled']
+        return self.status in ACTIVE_STATUSES
 
 
 class Review(models.Model):
@@ -199,6 +301,7 @@ class AppointmentReminder(models.Model):
         (1, '1 hour before'),
         (0.5, '30 minutes before'),
     )
+    _HOURS_LABELS = dict(REMINDER_TIMES)
 
     appointment = models.ForeignKey(Appointment, on_delete=models.CASCADE, related_name='reminders')
     reminder_type = models.CharField(max_length=10, choices=REMINDER_TYPES, default='email')
@@ -209,6 +312,8 @@ class AppointmentReminder(models.Model):
     sent_at = models.DateTimeField(null=True, blank=True)
     sent_via = models.CharField(max_length=10, null=True, blank=True)
     error_message = models.TextField(null=True, blank=True)
+    # Failed delivery attempts; the scheduler gives up after a few
+    retry_count = models.PositiveSmallIntegerField(default=0)
     
     # Scheduling
     scheduled_for = models.DateTimeField()
@@ -219,13 +324,20 @@ class AppointmentReminder(models.Model):
 
     class Meta:
         ordering = ['scheduled_for']
+        indexes = [
+            # Partial index covering only unsent rows, used by the reminder
+            # scheduler; is_sent is fixed by the condition, so only the
+            # scheduled time is keyed
+            models.Index(
+                fields=['scheduled_for'],
+                name='reminder_due_idx',
+                condition=models.Q(is_sent=False),
+            ),
+        ]
 
     def get_hours_before_display(self):
         """Get human-readable reminder time"""
-        for hours, label in self.REMINDER_TIMES:
-            if hours == self.hours_before:
-                return label
-        return f"{self.hours_before} hours before"
+        return self._HOURS_LABELS.get(self.hours_before, f"{self.hours_before} hours before")
 
 
 class StatusHistory(models.Model):
@@ -268,6 +380,10 @@ class Notification(models.Model):
 
     class Meta:
         ordering = ['-created_at']
+        indexes = [
+            # Unread count in the navbar and mark-all-read
+            models.Index(fields=['user', 'is_read']),
+        ]
 
 
 class DoctorSchedule(models.Model):
@@ -296,18 +412,17 @@ class DoctorSchedule(models.Model):
     class Meta:
         unique_together = ('doctor', 'day_of_week')
 
+    def get_slot_minutes(self):
+        """Slot start times for this day, as minutes since midnight"""
+        start_min = self.start_time.hour * 60 + self.start_time.minute
+        end_min = self.end_time.hour * 60 + self.end_time.minute
+        return range(start_min, end_min - self.slot_duration + 1, self.slot_duration)
+
     def get_time_slots(self):
         """Generate available time slots for this day"""
-        from datetime import datetime, timedelta
-        slots = []
-        current = datetime.combine(datetime.today(), self.start_time)
-        end = datetime.combine(datetime.today(), self.end_time)
-        
-        while current + timedelta(minutes=self.slot_duration) <= end:
-            slots.append(current.time())
-            current += timedelta(minutes=self.slot_duration)
-        
-        return slots
+        from datetime import time
+        # Work in minutes since midnight instead of stepping datetimes
+        return [time(m // 60, m % 60) for m in self.get_slot_minutes()]
 
 
 class TimeBlock(models.Model):
@@ -388,8 +503,10 @@ class Profile(models.Model):
         """Calculate age from date of birth"""
         if self.date_of_birth:
             today = timezone.now().date()
-            return today.year - self.date_of_birth.year - (
-                (today.month, today.day) < (self.date_of_birth.month, self.date_of_birth.day)
+            dob = self.date_of_birth
+            # Compare month/day packed as MMDD integers instead of building tuples
+            return today.year - dob.year - (
+                today.month * 100 + today.day < dob.month * 100 + dob.day
             )
         return None
 
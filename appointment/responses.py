@@ -0,0 +1,33 @@
+"""
+JSON responses for the API endpoints.
+
+orjson is used when it is installed and is noticeably faster on the large
+export payloads; without it the response is encoded exactly like
+Django's JsonResponse.
+"""
+import json
+
+from django.core.serializers.json import DjangoJSONEncoder
+from django.http import HttpResponse
+
+try:
+    import orjson
+except ImportError:  # optional dependency
+    orjson = None
+
+
+def dumps(data):
+    """Encode data to JSON bytes, handling the same types as DjangoJSONEncoder"""
+    if orjson is not None:
+        return orjson.dumps(data, default=DjangoJSONEncoder().default)
+    return json.dumps(data, cls=DjangoJSONEncoder).encode()
+
+
+class FastJsonResponse(HttpResponse):
+    """Drop-in for JsonResponse(dict) that serializes with orjson when available"""
+
+    def __init__(self, data, **kwargs):
+        if not isinstance(data, dict):
+            raise TypeError('In order to allow non-dict objects to be serialized set the safe parameter to False.')
+        kwargs.setdefault('content_type', 'application/json')
+        super().__init__(content=dumps(data), **kwargs)
@@ -1,22 +1,136 @@
-from django.db.models.signals import post_save, pre_save
+import threading
+from contextlib import contextmanager
+
+from django.db.models.signals import post_delete, post_save, pre_save
+from django.db import transaction
 from django.dispatch import receiver
 from django.contrib.auth.models import User
-from django.core.mail import send_mail
-from django.template.loader import render_to_string
-from django.utils.html import strip_tags
-from django.conf import settings
-from .models import Profile, Appointment, Notification, StatusHistory, Doctor
+from django.core.cache import cache
+from .models import Profile, Appointment, Notification, StatusHistory, Doctor, Review
+from .tasks import (
+    send_appointment_email_task, send_batched_emails_task, send_notification_email_task,
+)
+
+# Cached list of active doctor specializations for the doctors page
+SPECIALIZATIONS_CACHE_KEY = 'doctor_specializations'
+
+# Cached unread notification count per user for the navbar
+UNREAD_NOTIFICATIONS_CACHE_KEY = 'notif:unread:{}'
+
+# Notification types that are also emailed to the recipient
+EMAIL_NOTIFICATION_TYPES = ['appointment_created', 'status_changed']
+
+_profile_signal = threading.local()
+
+
+@contextmanager
+def disable_profile_signal():
+    """
+    Skip automatic Profile creation for User saves inside the block.
+    Batch importers should create the profiles afterwards in one query,
+    e.g. Profile.objects.bulk_create([...], ignore_conflicts=True).
+    """
+    previous = getattr(_profile_signal, 'disabled', False)
+    _profile_signal.disabled = True
+    try:
+        yield
+    finally:
+        _profile_signal.disabled = previous
+
+
+_collected = threading.local()
+
+
+@contextmanager
+def collect_notifications():
+    """
+    Buffer Notification and StatusHistory rows created through
+    create_notification()/create_status_history() inside the block.
+    The history rows are inserted with one bulk_create when the block
+    exits; the notifications are inserted with one bulk_create after
+    commit, followed by the block's status-change and notification emails
+    over one SMTP connection.
+    """
+    if getattr(_collected, 'rows', None) is not None:
+        # Nested block: the outermost one flushes
+        yield
+        return
+    _collected.rows = {Notification: [], StatusHistory: []}
+    _collected.status_emails = []
+    try:
+        yield
+        rows = _collected.rows
+        status_changed_ids = _collected.status_emails
+    finally:
+        _collected.rows = None
+        _collected.status_emails = None
+
+    StatusHistory.objects.bulk_create(rows[StatusHistory])
+    notifications = rows[Notification]
+    if status_changed_ids or notifications:
+        transaction.on_commit(
+            lambda: _write_notifications(notifications, status_changed_ids),
+            robust=True,
+        )
+
+
+def _write_notifications(notifications, status_changed_ids):
+    notifications = Notification.objects.bulk_create(notifications)
+    # bulk_create skips post_save, so drop the recipients' cached counts here
+    cache.delete_many([
+        UNREAD_NOTIFICATIONS_CACHE_KEY.format(user_id)
+        for user_id in {notification.user_id for notification in notifications}
+    ])
+    # bulk_create skips post_save, so pick up the emails notification_created would send
+    notification_ids = [
+        notification.pk for notification in notifications
+        if wants_notification_email(notification)
+    ]
+    if status_changed_ids or notification_ids:
+        send_batched_emails_task(status_changed_ids, notification_ids)
+
+
+def _create_or_collect(model, fields):
+    rows = getattr(_collected, 'rows', None)
+    if rows is None:
+        return model.objects.create(**fields)
+    instance = model(**fields)
+    rows[model].append(instance)
+    return instance
+
+
+def create_notification(**fields):
+    """
+    Write a Notification once the surrounding transaction commits, so the
+    badge row stays out of the request's transaction and is never written
+    for a rolled-back change. Inside collect_notifications() it is buffered
+    for the block's bulk insert instead.
+    """
+    rows = getattr(_collected, 'rows', None)
+    if rows is not None:
+        rows[Notification].append(Notification(**fields))
+        return
+    transaction.on_commit(lambda: Notification.objects.create(**fields), robust=True)
+
+
+def create_status_history(**fields):
+    """Create a StatusHistory row, or buffer it inside collect_notifications()"""
+    return _create_or_collect(StatusHistory, fields)
 
 
 @receiver(post_save, sender=User)
 def create_or_update_profile(sender, instance, created, **kwargs):
+    if getattr(_profile_signal, 'disabled', False):
+        return
     if created:
         Profile.objects.create(user=instance, role='patient')
-    else:
-        profile, created_profile = Profile.objects.get_or_create(user=instance)
-        if created_profile:
-            profile.role = 'patient'
-            profile.save()
+    elif User.profile.related.get_cached_value(instance, None) is not None:
+        # Already loaded, so it exists; select_related caches a missing
+        # profile as None, which still needs the check below
+        return
+    elif not Profile.objects.filter(user=instance).exists():
+        # Existence check on the unique user_id index instead of fetching the row
+        Profile.objects.create(user=instance, role='patient')
 
 
 @receiver(post_save, sender=Appointment)
@@ -27,7 +141,7 @@ def appointment_created(sender, instance, created, **kwargs):
         doctor_user = instance.doctor.user if instance.doctor else None
         
         if doctor_user:
-            Notification.objects.create(
+            create_notification(
                 user=doctor_user,
                 appointment=instance,
                 type='appointment_created',
@@ -35,162 +149,144 @@ def appointment_created(sender, instance, created, **kwargs):
                 message=f'New appointment request from {instance.patient_name} for {instance.appointment_date} at {instance.appointment_time}.'
             )
         
-        try:
-            send_appointment_email(instance, 'created')
-        except Exception as e:
-            print(f"Failed to send email: {e}")
+        appointment_id = instance.pk
+        transaction.on_commit(
+            lambda: send_appointment_email_task(appointment_id, 'created'), robust=True
+        )
 
 
 @receiver(pre_save, sender=Appointment)
 def appointment_status_changed(sender, instance, **kwargs):
+    """
+    Remember the stored status so post_save can detect a change.
+    Uses the status cached by Appointment.from_db. Unsaved instances skip
+    the lookup entirely; only rows loaded with status deferred fall back to
+    a single-column read.
+    """
+    instance._old_status = None
+    update_fields = kwargs.get('update_fields')
+    if update_fields is not None and 'status' not in update_fields:
+        # A save that doesn't write status can't change it
+        return
+    if hasattr(instance, '_loaded_status'):
+        instance._old_status = instance._loaded_status
+    elif instance.pk and not instance._state.adding:
+        instance._old_status = Appointment.objects.filter(
+            pk=instance.pk
+        ).values_list('status', flat=True).first()
+
+
+@receiver(post_save, sender=Appointment)
+def appointment_status_email(sender, instance, created, **kwargs):
     """
     Send email notifications on status change.
     NOTE: StatusHistory and Notification creation is handled in views.py 
     to avoid duplicates. This signal only handles email sending.
     """
-    if instance.pk:
-        try:
-            old_instance = Appointment.objects.get(pk=instance.pk)
-            if old_instance.status != instance.status:
-                # Only send email - StatusHistory and Notification are created in views
-                try:
-                    send_appointment_email(instance, 'status_changed')
-                except Exception as e:
-                    print(f"Failed to send status change email: {e}")
-        except Appointment.DoesNotExist:
-            pass
-
-
-def get_site_url():
-    """Get the site URL from settings"""
-    return getattr(settings, 'SITE_URL', 'http://localhost:8000')
-
-
-def send_appointment_email(appointment, email_type):
-    """Send email notifications for appointments"""
-    if not appointment.patient_email:
+    old_status = getattr(instance, '_old_status', None)
+    update_fields = kwargs.get('update_fields')
+    if update_fields is None or 'status' in update_fields:
+        # The row now holds the current status; later saves compare against it
+        instance._loaded_status = instance.status
+    if created or old_status is None or old_status == instance.status:
         return
-    
-    site_url = get_site_url()
-    from_email = getattr(settings, 'DEFAULT_FROM_EMAIL', 'noreply@doctorportal.com')
-    
-    subject = ""
-    html_message = ""
-    
-    if email_type == 'created':
-        subject = f"Appointment Request Received - {appointment.doctor.name}"
-        html_message = f"""
-        <html>
-        <body style="font-family: Arial, sans-serif; color: #333;">
-            <div style="max-width: 600px; margin: 0 auto; padding: 20px;">
-                <h2 style="color: #2563eb;">Appointment Request Received</h2>
-                <p>Dear {appointment.patient_name},</p>
-                <p>Your appointment request has been successfully submitted and is awaiting doctor approval.</p>
-                
-                <div style="background: #f8f9fa; padding: 15px; border-radius: 8px; margin: 20px 0;">
-                    <h3 style="margin: 0 0 10px 0; color: #374151;">Appointment Details:</h3>
-                    <p><strong>Doctor:</strong> {appointment.doctor.name}</p>
-                    <p><strong>Specialization:</strong> {appointment.doctor.specialization}</p>
-                    <p><strong>Date:</strong> {appointment.appointment_date}</p>
-                    <p><strong>Time:</strong> {appointment.appointment_time}</p>
-                    <p><strong>Status:</strong> {appointment.get_status_display()}</p>
-                    {f'<p><strong>Reason:</strong> {appointment.reason}</p>' if appointment.reason else ''}
-                </div>
-                
-                <p>You will receive another email once the doctor reviews and approves your appointment request.</p>
-                
-                <div style="text-align: center; margin: 30px 0;">
-                    <a href="{site_url}/patient/dashboard/" style="background: #2563eb; color: white; padding: 12px 24px; text-decoration: none; border-radius: 6px;">View Dashboard</a>
-                </div>
-                
-                <p>Best regards,<br>Doctor Appointment Portal Team</p>
-            </div>
-        </body>
-        </html>
-        """
-    
-    elif email_type == 'status_changed':
-        status_messages = {
-            'approved': 'approved and confirmed',
-            'scheduled': 'scheduled for your selected time',
-            'completed': 'completed successfully',
-            'cancelled': 'cancelled',
-            'rescheduled': 'rescheduled to a new time',
-            'no_show': 'marked as no-show',
-            'rejected': 'rejected'
-        }
-        
-        message = status_messages.get(appointment.status, f'changed to {appointment.status}')
-        
-        subject = f"Appointment {message.title()} - {appointment.doctor.name}"
-        html_message = f"""
-        <html>
-        <body style="font-family: Arial, sans-serif; color: #333;">
-            <div style="max-width: 600px; margin: 0 auto; padding: 20px;">
-                <h2 style="color: #059669;">Appointment Status Update</h2>
-                <p>Dear {appointment.patient_name},</p>
-                <p>Your appointment status has been updated: <strong>{message}</strong>.</p>
-                
-                <div style="background: #f8f9fa; padding: 15px; border-radius: 8px; margin: 20px 0;">
-                    <h3 style="margin: 0 0 10px 0; color: #374151;">Appointment Details:</h3>
-                    <p><strong>Doctor:</strong> {appointment.doctor.name}</p>
-                    <p><strong>Specialization:</strong> {appointment.doctor.specialization}</p>
-                    <p><strong>Date:</strong> {appointment.appointment_date}</p>
-                    <p><strong>Time:</strong> {appointment.appointment_time}</p>
-                    <p><strong>Current Status:</strong> {appointment.get_status_display()}</p>
-                    {f'<p><strong>Cancellation Reason:</strong> {appointment.cancellation_reason}</p>' if appointment.cancellation_reason else ''}
-                </div>
-                
-                <div style="text-align: center; margin: 30px 0;">
-                    <a href="{site_url}/patient/dashboard/" style="background: #2563eb; color: white; padding: 12px 24px; text-decoration: none; border-radius: 6px;">View Dashboard</a>
-                </div>
-                
-                <p>Best regards,<br>Doctor Appointment Portal Team</p>
-            </div>
-        </body>
-        </html>
-        """
-    
-    if subject and html_message:
-        # Create plain text version
-        plain_message = strip_tags(html_message)
-        
-        try:
-            send_mail(
-                subject=subject,
-                message=plain_message,
-                from_email=from_email,
-                recipient_list=[appointment.patient_email],
-                html_message=html_message,
-                fail_silently=False,
-            )
-        except Exception as e:
-            print(f"Failed to send email: {e}")
+
+    queue_status_change_email(instance.pk)
+
+
+def queue_status_change_email(appointment_id):
+    """
+    Email the patient about a status change once the transaction commits.
+    Callers that change status with QuerySet.update() use this directly,
+    since no post_save fires for them.
+    """
+    status_emails = getattr(_collected, 'status_emails', None)
+    if status_emails is not None:
+        # Sent with the rest of the batch when collect_notifications() exits
+        status_emails.append(appointment_id)
+        return
+
+    # Send after the transaction commits so SMTP latency never holds row locks
+    transaction.on_commit(
+        lambda: send_appointment_email_task(appointment_id, 'status_changed'), robust=True
+    )
+
+
+def wants_notification_email(notification):
+    """
+    Whether a notification should be emailed. Uses the recipient's profile
+    only when the creator already loaded it (e.g. via select_related), so an
+    opted-out user costs no query here; otherwise the email task checks it.
+    """
+    if notification.type not in EMAIL_NOTIFICATION_TYPES:
+        return False
+    user = notification.user
+    if not user.email:
+        return False
+    if User.profile.is_cached(user):
+        return user.profile.email_notifications
+    return True
+
+
+def queue_notification_email(notification):
+    """Email important notifications once the surrounding transaction commits"""
+    if wants_notification_email(notification):
+        notification_id = notification.pk
+        transaction.on_commit(
+            lambda: send_notification_email_task(notification_id), robust=True
+        )
 
 
 @receiver(post_save, sender=Notification)
 def notification_created(sender, instance, created, **kwargs):
     """Send email for important notifications"""
-    if created and instance.user.profile.email_notifications:
-        important_types = ['appointment_created', 'status_changed']
-        
-        if instance.type in important_types and instance.user.email:
-            try:
-                subject = f"Appointment Update - {instance.title}"
-                message = f"""
-                {instance.title}
-                
-                {instance.message}
-                
-                Please log in to your dashboard for more details.
-                """
-                
-                send_mail(
-                    subject=subject,
-                    message=message,
-                    from_email='noreply@doctorportal.com',
-                    recipient_list=[instance.user.email],
-                    fail_silently=True,
-                )
-            except Exception as e:
-                print(f"Failed to send notification email: {e}")
+    if created:
+        queue_notification_email(instance)
+
+
+@receiver(post_save, sender=Notification)
+@receiver(post_delete, sender=Notification)
+def clear_unread_count(sender, instance, **kwargs):
+    """Drop the recipient's cached unread count when one of their notifications changes"""
+    cache.delete(UNREAD_NOTIFICATIONS_CACHE_KEY.format(instance.user_id))
+
+
+@receiver(post_save, sender=Doctor)
+@receiver(post_delete, sender=Doctor)
+def clear_specializations_cache(sender, instance, **kwargs):
+    """Drop the cached specializations list when a doctor may have changed it"""
+    update_fields = kwargs.get('update_fields')
+    if update_fields is not None and not {'specialization', 'is_active'} & set(update_fields):
+        # e.g. rating-only saves
+        return
+    cache.delete(SPECIALIZATIONS_CACHE_KEY)
+
+
+@receiver(pre_save, sender=Review)
+def review_remember_rating(sender, instance, **kwargs):
+    """Remember the stored approval state so post_save can adjust the doctor's rating"""
+    instance._old_rating = None
+    if instance.pk:
+        instance._old_rating = Review.objects.filter(
+            pk=instance.pk
+        ).values_list('doctor_id', 'is_approved', 'rating').first()
+
+
+@receiver(post_save, sender=Review)
+def review_update_doctor_rating(sender, instance, created, **kwargs):
+    """Keep Doctor.average_rating/total_reviews in step with approved reviews"""
+    old = getattr(instance, '_old_rating', None)
+    new = (instance.doctor_id, instance.is_approved, instance.rating)
+    if old == new:
+        return
+    if old and old[1]:
+        Doctor.decrement_rating(old[0], old[2])
+    if instance.is_approved:
+        Doctor.increment_rating(instance.doctor_id, instance.rating)
+
+
+@receiver(post_delete, sender=Review)
+def review_deleted(sender, instance, **kwargs):
+    """Drop a deleted approved review from the doctor's rating"""
+    if instance.is_approved:
+        Doctor.decrement_rating(instance.doctor_id, instance.rating)
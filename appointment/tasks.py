@@ -0,0 +1,337 @@
+"""
+Background jobs for the appointment app.
+
+These are plain functions so they can be run from management commands or
+cron, and wrapped by a task queue worker without changes.
+
+There is no task queue yet: the send_*_task functions are called through
+transaction.on_commit by the signals and views, so they still run
+synchronously in the request thread once the transaction commits. That keeps
+a rolled-back change from sending mail, but SMTP latency is still part of the
+response time until a worker picks these functions up.
+"""
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import suppress
+from smtplib import SMTPException
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.mail import EmailMessage, EmailMultiAlternatives, get_connection
+from django.db import transaction
+from django.template import TemplateDoesNotExist
+from django.template.loader import render_to_string
+from django.utils import timezone
+from django.utils.html import strip_tags
+from .models import Appointment, AppointmentReminder, Notification
+
+logger = logging.getLogger(__name__)
+
+_STATUS_MESSAGES = {
+    'approved': 'approved and confirmed',
+    'scheduled': 'scheduled for your selected time',
+    'completed': 'completed successfully',
+    'cancelled': 'cancelled',
+    'rescheduled': 'rescheduled to a new time',
+    'no_show': 'marked as no-show',
+    'rejected': 'rejected'
+}
+
+_STATUS_DISPLAY = dict(Appointment.STATUS_CHOICES)
+
+# Appointments whose reminders are emailed and saved per batch
+REMINDER_BATCH_SIZE = 500
+
+# Concurrent SMTP connections used to send each batch of reminders
+REMINDER_SEND_WORKERS = 4
+
+# Failed attempts after which a reminder is no longer retried
+REMINDER_MAX_RETRIES = 3
+
+# Longest error text stored on a failed reminder
+REMINDER_ERROR_LENGTH = 500
+
+
+def get_site_url():
+    """Get the site URL from settings"""
+    return getattr(settings, 'SITE_URL', 'http://localhost:8000')
+
+
+def build_appointment_email(appointment, email_type):
+    """Build the email for an appointment event, or None if there is nothing to send"""
+    if not appointment.patient_email:
+        return None
+    
+    site_url = get_site_url()
+    from_email = getattr(settings, 'DEFAULT_FROM_EMAIL', 'noreply@doctorportal.com')
+    
+    subject = ""
+    context = {
+        'appointment': appointment,
+        'site_url': site_url,
+        'status_display': _STATUS_DISPLAY.get(appointment.status, appointment.status),
+    }
+
+    if email_type == 'created':
+        subject = f"Appointment Request Received - {appointment.doctor.name}"
+
+    elif email_type == 'status_changed':
+        message = _STATUS_MESSAGES.get(appointment.status, f'changed to {appointment.status}')
+        context['status_message'] = message
+
+        subject = f"Appointment {message.title()} - {appointment.doctor.name}"
+
+    if not subject:
+        return None
+
+    # Each email type has an emails/<email_type>.html and .txt template;
+    # plain text is rendered rather than stripped from the HTML
+    html_message = render_to_string(f'emails/{email_type}.html', context)
+    try:
+        plain_message = render_to_string(f'emails/{email_type}.txt', context)
+    except TemplateDoesNotExist:
+        plain_message = strip_tags(html_message)
+
+    email = EmailMultiAlternatives(
+        subject=subject,
+        body=plain_message,
+        from_email=from_email,
+        to=[appointment.patient_email],
+    )
+    email.attach_alternative(html_message, 'text/html')
+    return email
+
+
+def build_notification_email(notification):
+    """Build the email for an important notification, or None if the user opted out"""
+    user = notification.user
+    if not user.email or not user.profile.email_notifications:
+        return None
+
+    return EmailMessage(
+        subject=f"Appointment Update - {notification.title}",
+        body=render_to_string('emails/notification.txt', {'notification': notification}),
+        from_email='noreply@doctorportal.com',
+        to=[user.email],
+    )
+
+
+def send_all(messages, fail_silently=False):
+    """Send a batch of messages over one SMTP connection"""
+    messages = [message for message in messages if message is not None]
+    if not messages:
+        return
+    try:
+        with get_connection(fail_silently=fail_silently) as connection:
+            connection.send_messages(messages)
+    except (SMTPException, OSError):
+        logger.exception("Failed to send %d emails", len(messages))
+
+
+def send_appointment_email(appointment, email_type):
+    """Send email notifications for appointments"""
+    send_all([build_appointment_email(appointment, email_type)])
+
+
+def send_notification_email(notification):
+    """Email the recipient of an important notification, if they opted in"""
+    send_all([build_notification_email(notification)], fail_silently=True)
+
+
+def send_appointment_email_task(appointment_id, email_type):
+    """Load the appointment by id and send its email"""
+    appointment = Appointment.objects.with_signal_context().filter(
+        pk=appointment_id
+    ).first()
+    if appointment:
+        send_appointment_email(appointment, email_type)
+
+
+def send_notification_email_task(notification_id):
+    """Load the notification by id and send its email"""
+    notification = Notification.objects.select_related('user__profile').filter(
+        pk=notification_id
+    ).first()
+    if notification:
+        send_notification_email(notification)
+
+
+def send_batched_emails_task(status_changed_ids, notification_ids):
+    """
+    Send the status-change and notification emails for a batch of
+    appointments over a single SMTP connection.
+    """
+    messages = [
+        build_appointment_email(appointment, 'status_changed')
+        for appointment in Appointment.objects.with_signal_context().filter(
+            pk__in=status_changed_ids
+        )
+    ]
+    messages += [
+        build_notification_email(notification)
+        for notification in Notification.objects.select_related('user__profile').filter(
+            pk__in=notification_ids
+        )
+    ]
+    send_all(messages)
+
+
+def build_activation_email(user, activation_url):
+    """Build the account activation email, or None if the user has no address"""
+    if not user.email:
+        return None
+
+    context = {'user': user, 'activation_url': activation_url}
+    subject = "Verify your email to activate your account"
+    plain_message = render_to_string('emails/activation.txt', context)
+    html_message = render_to_string('emails/activation.html', context)
+
+    email = EmailMultiAlternatives(
+        subject=subject,
+        body=plain_message,
+        from_email=settings.DEFAULT_FROM_EMAIL,
+        to=[user.email],
+    )
+    email.attach_alternative(html_message, 'text/html')
+    return email
+
+
+def send_activation_email_task(user_id, activation_url):
+    """Load the user by id and send their activation email"""
+    user = User.objects.filter(pk=user_id).first()
+    if user:
+        send_all([build_activation_email(user, activation_url)])
+
+
+def get_due_reminders(now=None):
+    """Return unsent reminders whose scheduled time has passed and that have retries left"""
+    now = now or timezone.now()
+    return AppointmentReminder.objects.filter(
+        is_sent=False,
+        scheduled_for__lte=now,
+        retry_count__lt=REMINDER_MAX_RETRIES,
+    ).select_related('appointment', 'appointment__doctor').only(
+        'is_sent', 'sent_at', 'sent_via', 'reminder_type', 'scheduled_for', 'error_message',
+        'retry_count',
+        'appointment__id', 'appointment__patient_name', 'appointment__patient_email',
+        'appointment__appointment_date', 'appointment__appointment_time',
+        'appointment__doctor__name', 'appointment__doctor__specialization',
+    )
+
+
+def build_reminder_message(appointment):
+    """Build the reminder email for an appointment"""
+    return EmailMultiAlternatives(
+        subject=f"Appointment Reminder - {appointment.doctor.name}",
+        body=render_to_string('emails/reminder.txt', {'appointment': appointment}),
+        from_email='noreply@doctorportal.com',
+        to=[appointment.patient_email],
+    )
+
+
+def send_pending_reminders(now=None):
+    """
+    Send all due email reminders in batches, spread over a small pool of
+    SMTP connections. Returns a (sent, failed) tuple of reminder lists.
+    """
+    now = now or timezone.now()
+    sent = []
+    failed = []
+
+    # Reminders that fall due together for the same appointment (e.g. the
+    # 24h and 2h ones after the scheduler was down) share a single email.
+    # Ordering by appointment keeps each group contiguous, so the rows can
+    # be streamed and flushed a batch of appointments at a time.
+    due = get_due_reminders(now).filter(
+        reminder_type__in=['email', 'both']
+    ).order_by('appointment_id', 'pk')
+    batch = {}
+    # One SMTP session per worker for the whole run, each opened by its
+    # first send and closed when the last batch is out
+    connections = [get_connection() for _ in range(REMINDER_SEND_WORKERS)]
+    try:
+        with ThreadPoolExecutor(max_workers=REMINDER_SEND_WORKERS) as pool:
+            for reminder in due.iterator(chunk_size=REMINDER_BATCH_SIZE):
+                if len(batch) >= REMINDER_BATCH_SIZE and reminder.appointment_id not in batch:
+                    _send_reminder_batch(batch, now, sent, failed, pool, connections)
+                    batch = {}
+                batch.setdefault(reminder.appointment_id, []).append(reminder)
+            if batch:
+                _send_reminder_batch(batch, now, sent, failed, pool, connections)
+    finally:
+        for connection in connections:
+            with suppress(SMTPException, OSError):
+                connection.close()
+
+    return sent, failed
+
+
+def _send_reminder_batch(due, now, sent, failed, pool, connections):
+    """Email one batch of grouped reminders and record the outcome in bulk"""
+    batch_sent = []
+    batch_failed = []
+    pending = []
+    for reminders in due.values():
+        try:
+            pending.append((build_reminder_message(reminders[0].appointment), reminders))
+        except Exception as e:
+            for reminder in reminders:
+                reminder.error_message = str(e)[:REMINDER_ERROR_LENGTH]
+            batch_failed.extend(reminders)
+
+    # Each worker sends its share over its own connection, so the SMTP
+    # round trips overlap. Messages are built above, in this thread; the
+    # workers never touch the database.
+    shares = [pending[i::len(connections)] for i in range(len(connections))]
+    for results in pool.map(_send_reminder_share, shares, connections):
+        for reminders, error in results:
+            if error is None:
+                batch_sent.extend(reminders)
+                continue
+            for reminder in reminders:
+                reminder.error_message = error[:REMINDER_ERROR_LENGTH]
+            batch_failed.extend(reminders)
+    for reminder in batch_failed:
+        reminder.retry_count += 1
+    for reminder in batch_sent:
+        reminder.is_sent = True
+        reminder.sent_at = now
+        reminder.sent_via = 'email'
+
+    # Flush status changes in one transaction rather than one UPDATE per
+    # reminder; earlier batches stay recorded if a later one fails
+    with transaction.atomic():
+        AppointmentReminder.objects.bulk_update(
+            batch_sent, ['is_sent', 'sent_at', 'sent_via'], batch_size=REMINDER_BATCH_SIZE
+        )
+        AppointmentReminder.objects.bulk_update(
+            batch_failed, ['error_message', 'retry_count'], batch_size=REMINDER_BATCH_SIZE
+        )
+
+    sent.extend(batch_sent)
+    failed.extend(batch_failed)
+
+
+def _send_reminder_share(share, connection):
+    """
+    Send each (message, reminders) pair of a share over one connection, one
+    message at a time, and return a (reminders, error) pair for each; error
+    is None once the server has accepted the message.
+    """
+    results = []
+    for message, reminders in share:
+        try:
+            # Opening an open connection is a no-op; the caller closes it
+            connection.open()
+            connection.send_messages([message])
+        except (SMTPException, OSError) as e:
+            logger.exception(
+                "Failed to send reminder for appointment %s", reminders[0].appointment_id
+            )
+            results.append((reminders, str(e) or 'Email delivery failed; will retry'))
+            # Drop the session in case it is broken; the next message reconnects
+            with suppress(SMTPException, OSError):
+                connection.close()
+        else:
+            results.append((reminders, None))
+    return results
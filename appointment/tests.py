@@ -1,3 +1,484 @@
-from django.test import TestCase
+import datetime
+from smtplib import SMTPException
+from unittest import mock
 
-# Create your tests here.
+from django.contrib.auth.models import User
+from django.core import mail
+from django.core.cache import cache
+from django.core.mail.backends.locmem import EmailBackend
+from django.test import TestCase, override_settings
+from django.urls import reverse
+from django.utils import timezone
+
+from . import tasks
+from .models import (
+    Appointment, AppointmentReminder, Doctor, DoctorSchedule, Profile, Review,
+    StatusHistory,
+)
+
+
+# Keep the cached badge counts and listings out of the shared file cache so
+# query counts don't depend on what an earlier run left behind
+@override_settings(
+    CACHES={'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}},
+    EMAIL_BACKEND='django.core.mail.backends.locmem.EmailBackend',
+)
+class AppointmentTestCase(TestCase):
+    """A patient, a doctor open 09:00-12:00 every day and three bookings"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.patient = User.objects.create_user('pat', 'pat@example.com', 'pw')
+        cls.doctor_user = User.objects.create_user('doc', 'doc@example.com', 'pw')
+        Profile.objects.filter(user=cls.doctor_user).update(role='doctor')
+        cls.doctor = Doctor.objects.create(
+            user=cls.doctor_user, name='doc', specialization='Cardiology'
+        )
+        for day, _ in DoctorSchedule.DAYS_OF_WEEK:
+            DoctorSchedule.objects.create(
+                doctor=cls.doctor, day_of_week=day, start_time=datetime.time(9),
+                end_time=datetime.time(12), slot_duration=30,
+            )
+        today = timezone.now().date()
+        cls.appointments = [
+            Appointment.objects.create(
+                patient_name='pat', patient_email='pat@example.com', doctor=cls.doctor,
+                appointment_date=today + datetime.timedelta(days=i + 1),
+                appointment_time=datetime.time(9 + i), user=cls.patient, reason=f'r{i}',
+            )
+            for i in range(3)
+        ]
+
+    def setUp(self):
+        cache.clear()
+
+
+class BookingTests(AppointmentTestCase):
+
+    def test_active_slot_can_only_be_booked_once(self):
+        taken = self.appointments[0]
+        self.client.force_login(self.patient)
+        response = self.client.post(reverse('book', args=[self.doctor.id]), {
+            'date': taken.appointment_date.isoformat(),
+            'time': taken.appointment_time.strftime('%H:%M'),
+        }, follow=True)
+        self.assertRedirects(response, reverse('book', args=[self.doctor.id]))
+        self.assertEqual(
+            [str(m) for m in response.context['messages']],
+            ['This time slot is already booked. Please choose another time.'],
+        )
+        self.assertEqual(Appointment.objects.count(), 3)
+
+    def test_cancelled_slot_can_be_booked_again(self):
+        taken = self.appointments[0]
+        Appointment.objects.filter(pk=taken.pk).update(status='cancelled')
+        self.client.force_login(self.patient)
+        response = self.client.post(reverse('book', args=[self.doctor.id]), {
+            'date': taken.appointment_date.isoformat(),
+            'time': taken.appointment_time.strftime('%H:%M'),
+        })
+        self.assertRedirects(response, reverse('patient_dashboard'))
+        self.assertEqual(Appointment.objects.count(), 4)
+
+    def test_rescheduled_slot_stays_booked(self):
+        appointment = self.appointments[0]
+        Appointment.objects.filter(pk=appointment.pk).update(status='rescheduled')
+        self.client.force_login(self.patient)
+        self.client.post(reverse('book', args=[self.doctor.id]), {
+            'date': appointment.appointment_date.isoformat(),
+            'time': appointment.appointment_time.strftime('%H:%M'),
+        })
+        self.assertEqual(Appointment.objects.count(), 3)
+
+
+class StatusUpdateTests(AppointmentTestCase):
+
+    def rebook(self, appointment):
+        """Cancel appointment and give its slot to a new booking"""
+        Appointment.objects.filter(pk=appointment.pk).update(status='cancelled')
+        return Appointment.objects.create(
+            patient_name='new', patient_email='new@example.com', doctor=self.doctor,
+            appointment_date=appointment.appointment_date,
+            appointment_time=appointment.appointment_time,
+        )
+
+    def test_reactivating_rebooked_slot_is_a_conflict(self):
+        appointment = self.appointments[0]
+        self.rebook(appointment)
+        self.client.force_login(self.doctor_user)
+        response = self.client.post(
+            reverse('update_appointment_status', args=[appointment.id]), {'status': 'approved'}
+        )
+        self.assertEqual(response.status_code, 409)
+        appointment.refresh_from_db()
+        self.assertEqual(appointment.status, 'cancelled')
+        self.assertFalse(appointment.status_history.exists())
+
+    def test_bulk_update_skips_rebooked_slots(self):
+        rebooked, free, active = self.appointments
+        self.rebook(rebooked)
+        Appointment.objects.filter(pk=free.pk).update(status='cancelled')
+        self.client.force_login(self.doctor_user)
+        response = self.client.post(reverse('bulk_update_appointments'), {
+            'appointment_ids[]': [rebooked.id, free.id, active.id], 'status': 'approved',
+        })
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['updated_count'], 2)
+        self.assertEqual(response.json()['skipped_ids'], [rebooked.id])
+        self.assertEqual(
+            dict(Appointment.objects.filter(
+                pk__in=[rebooked.pk, free.pk, active.pk]
+            ).values_list('pk', 'status')),
+            {rebooked.pk: 'cancelled', free.pk: 'approved', active.pk: 'approved'},
+        )
+
+
+class RescheduleTests(AppointmentTestCase):
+
+    def test_reschedule_onto_booked_slot_is_refused(self):
+        appointment, other = self.appointments[:2]
+        self.client.force_login(self.patient)
+        response = self.client.post(
+            reverse('reschedule_appointment', args=[appointment.id]),
+            {'date': other.appointment_date, 'time': other.appointment_time},
+        )
+        self.assertRedirects(
+            response, reverse('reschedule_appointment', args=[appointment.id]),
+            fetch_redirect_response=False,
+        )
+        appointment.refresh_from_db()
+        self.assertEqual(appointment.status, 'pending')
+        self.assertFalse(appointment.status_history.exists())
+
+    def test_reschedule_to_free_slot(self):
+        appointment = self.appointments[0]
+        self.client.force_login(self.patient)
+        response = self.client.post(
+            reverse('reschedule_appointment', args=[appointment.id]),
+            {'date': '2030-01-01', 'time': '09:00'},
+        )
+        self.assertRedirects(response, reverse('patient_dashboard'))
+        appointment.refresh_from_db()
+        self.assertEqual(appointment.status, 'rescheduled')
+        self.assertEqual(appointment.appointment_date, datetime.date(2030, 1, 1))
+        self.assertEqual(appointment.status_history.count(), 1)
+
+    def test_reschedule_race_is_caught_by_the_constraint(self):
+        appointment, other = self.appointments[:2]
+        self.client.force_login(self.patient)
+        # Let the slot look free to the early check, as when a concurrent
+        # reschedule commits between the check and the save
+        with mock.patch('appointment.views.Appointment.objects.filter') as filter:
+            filter.return_value.exclude.return_value.exists.return_value = False
+            response = self.client.post(
+                reverse('reschedule_appointment', args=[appointment.id]),
+                {'date': other.appointment_date, 'time': other.appointment_time},
+            )
+        self.assertRedirects(
+            response, reverse('reschedule_appointment', args=[appointment.id]),
+            fetch_redirect_response=False,
+        )
+        appointment.refresh_from_db()
+        self.assertEqual(appointment.status, 'pending')
+
+
+class SendPendingRemindersTests(AppointmentTestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        due = timezone.now() - datetime.timedelta(minutes=1)
+        for appointment in cls.appointments:
+            AppointmentReminder.objects.create(appointment=appointment, scheduled_for=due)
+
+    def send_failing(self, failing=lambda message: True):
+        """Run the job with the backend raising for the messages picked by failing"""
+        send_messages = EmailBackend.send_messages
+
+        def fake_send_messages(backend, messages):
+            if any(failing(message) for message in messages):
+                raise SMTPException('down')
+            return send_messages(backend, messages)
+
+        with mock.patch.object(EmailBackend, 'send_messages', fake_send_messages), \
+                self.assertLogs('appointment.tasks', 'ERROR'):
+            return tasks.send_pending_reminders()
+
+    def test_sends_due_reminders(self):
+        sent, failed = tasks.send_pending_reminders()
+        self.assertEqual((len(sent), len(failed)), (3, 0))
+        self.assertEqual(len(mail.outbox), 3)
+        self.assertFalse(AppointmentReminder.objects.filter(is_sent=False).exists())
+
+    def test_undelivered_reminders_are_sent_on_the_next_run(self):
+        sent, failed = self.send_failing()
+        self.assertEqual((len(sent), len(failed)), (0, 3))
+        self.assertFalse(AppointmentReminder.objects.filter(is_sent=True).exists())
+        self.assertEqual(mail.outbox, [])
+
+        sent, failed = tasks.send_pending_reminders()
+        self.assertEqual((len(sent), len(failed)), (3, 0))
+        self.assertEqual(len(mail.outbox), 3)
+
+    def test_failed_reminder_is_retried_alone(self):
+        failing = self.appointments[0]
+        failing.patient_email = 'down@example.com'
+        failing.save(update_fields=['patient_email'])
+
+        sent, failed = self.send_failing(lambda message: message.to == ['down@example.com'])
+        self.assertEqual(len(sent), 2)
+        self.assertEqual([reminder.appointment_id for reminder in failed], [failing.pk])
+        reminder = AppointmentReminder.objects.get(appointment=failing)
+        self.assertFalse(reminder.is_sent)
+        self.assertEqual(reminder.retry_count, 1)
+        self.assertEqual(reminder.error_message, 'down')
+
+        # The next run only retries the failed reminder
+        mail.outbox.clear()
+        sent, failed = tasks.send_pending_reminders()
+        self.assertEqual(([r.appointment_id for r in sent], failed), ([failing.pk], []))
+        self.assertEqual(mail.outbox[0].to, ['down@example.com'])
+
+    def test_failure_does_not_fail_the_rest_of_its_share(self):
+        # More appointments than workers, so each connection sends several
+        # messages and the failing one shares its connection with good ones
+        today = timezone.now().date()
+        due = timezone.now() - datetime.timedelta(minutes=1)
+        for i in range(2 * tasks.REMINDER_SEND_WORKERS):
+            appointment = Appointment.objects.create(
+                patient_name=f'p{i}', patient_email=f'p{i}@example.com', doctor=self.doctor,
+                appointment_date=today + datetime.timedelta(days=10 + i),
+                appointment_time=datetime.time(9), user=self.patient,
+            )
+            AppointmentReminder.objects.create(appointment=appointment, scheduled_for=due)
+        failing = self.appointments[0]
+        failing.patient_email = 'down@example.com'
+        failing.save(update_fields=['patient_email'])
+
+        sent, failed = self.send_failing(lambda message: message.to == ['down@example.com'])
+        total = AppointmentReminder.objects.count()
+        self.assertEqual(len(sent), total - 1)
+        self.assertEqual([reminder.appointment_id for reminder in failed], [failing.pk])
+        self.assertEqual(len(mail.outbox), total - 1)
+        self.assertEqual(
+            AppointmentReminder.objects.filter(retry_count__gt=0).get().appointment_id,
+            failing.pk,
+        )
+
+        # Only the refused message goes out again; nobody gets a duplicate
+        mail.outbox.clear()
+        tasks.send_pending_reminders()
+        self.assertEqual([message.to for message in mail.outbox], [['down@example.com']])
+
+    def test_gives_up_after_max_retries(self):
+        for _ in range(tasks.REMINDER_MAX_RETRIES):
+            sent, failed = self.send_failing()
+            self.assertEqual((len(sent), len(failed)), (0, 3))
+        self.assertEqual(
+            set(AppointmentReminder.objects.values_list('retry_count', flat=True)),
+            {tasks.REMINDER_MAX_RETRIES},
+        )
+        self.assertEqual(tasks.send_pending_reminders(), ([], []))
+        self.assertEqual(mail.outbox, [])
+
+
+class ReviewRatingTests(AppointmentTestCase):
+
+    def create_review(self, rating, is_approved=False):
+        user = User.objects.create_user(f'reviewer{Review.objects.count()}')
+        return Review.objects.create(
+            doctor=self.doctor, patient=user, rating=rating, comment='c',
+            is_approved=is_approved,
+        )
+
+    def assertRating(self, average, total):
+        self.doctor.refresh_from_db()
+        self.assertEqual(str(self.doctor.average_rating), average)
+        self.assertEqual(self.doctor.total_reviews, total)
+
+    def test_unapproved_reviews_do_not_count(self):
+        self.create_review(5)
+        self.assertRating('0.00', 0)
+
+    def test_approving_adds_to_rating(self):
+        reviews = [self.create_review(rating) for rating in (5, 4, 2)]
+        for review in reviews:
+            review.is_approved = True
+            review.save()
+        self.assertRating('3.67', 3)
+
+    def test_editing_approved_review_moves_rating(self):
+        review = self.create_review(5, is_approved=True)
+        self.create_review(4, is_approved=True)
+        review.rating = 1
+        review.save()
+        self.assertRating('2.50', 2)
+
+    def test_unapproving_and_deleting_remove_from_rating(self):
+        first, second, third = [
+            self.create_review(rating, is_approved=True) for rating in (1, 4, 2)
+        ]
+        second.delete()
+        third.is_approved = False
+        third.save()
+        self.assertRating('1.00', 1)
+        first.delete()
+        self.assertRating('0.00', 0)
+
+    def test_deleting_unapproved_review_leaves_rating(self):
+        self.create_review(4, is_approved=True)
+        self.create_review(1).delete()
+        self.assertRating('4.00', 1)
+
+
+class DoctorDashboardTests(AppointmentTestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        # A full first page of newer bookings pushes the fixtures onto page 2
+        today = timezone.now().date()
+        Appointment.objects.bulk_create(
+            Appointment(
+                patient_name=f'p{i}', patient_email=f'p{i}@example.com', doctor=cls.doctor,
+                appointment_date=today + datetime.timedelta(days=10 + i),
+                appointment_time=datetime.time(9), reason='checkup',
+            )
+            for i in range(30)
+        )
+
+    def get_dashboard(self, **params):
+        self.client.force_login(self.doctor_user)
+        return self.client.get(reverse('doctor_dashboard'), params)
+
+    def test_search_covers_every_page(self):
+        response = self.get_dashboard(q='R1')
+        self.assertEqual(
+            [appointment.pk for appointment in response.context['appointments']],
+            [self.appointments[1].pk],
+        )
+
+    def test_status_filter_and_search_are_kept_in_page_links(self):
+        response = self.get_dashboard(status='pending', q='checkup')
+        self.assertEqual(response.context['page_obj'].paginator.count, 30)
+        self.assertContains(response, '?page=2&status=pending&q=checkup')
+        self.assertContains(response, '<option value="pending" selected>')
+
+
+class ProfileSignalTests(AppointmentTestCase):
+
+    def test_saving_a_user_without_profile_creates_it(self):
+        Profile.objects.filter(user=self.patient).delete()
+        # Loaded the way ProfileModelBackend loads the session user, which
+        # caches the missing profile as None
+        user = User.objects.select_related('profile').get(pk=self.patient.pk)
+        user.save()
+        self.assertEqual(Profile.objects.get(user=self.patient).role, 'patient')
+
+    def test_saving_a_user_with_loaded_profile_skips_the_check(self):
+        user = User.objects.select_related('profile').get(pk=self.patient.pk)
+        with self.assertNumQueries(1):
+            user.save(update_fields=['email'])
+
+
+class QueryCountTests(AppointmentTestCase):
+    """Pages and endpoints whose query count must not grow with their rows"""
+
+    def test_appointment_details(self):
+        appointment = self.appointments[0]
+        for _ in range(4):
+            StatusHistory.objects.create(
+                appointment=appointment, old_status='pending', new_status='approved',
+                changed_by=self.doctor_user,
+            )
+        self.client.force_login(self.doctor_user)
+        with self.assertNumQueries(4):
+            response = self.client.get(
+                reverse('get_appointment_details', args=[appointment.id])
+            )
+        self.assertEqual(len(response.json()['appointment']['status_history']), 4)
+
+    def test_calendar_events(self):
+        for user in (self.doctor_user, self.patient):
+            self.client.force_login(user)
+            with self.assertNumQueries(3):
+                response = self.client.get(reverse('calendar_events'))
+            self.assertEqual(len(response.json()), 3)
+
+    def test_doctor_detail(self):
+        for i, rating in enumerate([5, 4, 4, 1]):
+            user = User.objects.create_user(f'reviewer{i}')
+            Review.objects.create(
+                doctor=self.doctor, patient=user, rating=rating, comment='c', is_approved=True,
+            )
+        self.client.force_login(self.patient)
+        with self.assertNumQueries(7):
+            response = self.client.get(reverse('doctor_detail', args=[self.doctor.id]))
+        self.assertEqual(response.context['rating_distribution'], {1: 1, 2: 0, 3: 0, 4: 2, 5: 1})
+
+    def test_available_slots_v2(self):
+        date = self.appointments[0].appointment_date
+        self.client.force_login(self.patient)
+        with self.assertNumQueries(5):
+            response = self.client.get(reverse('get_available_slots_v2'), {
+                'doctor_id': self.doctor.id, 'date': date.strftime('%Y-%m-%d'),
+            })
+        self.assertEqual(
+            [slot['time'] for slot in response.json()['slots']],
+            ['09:30', '10:00', '10:30', '11:00', '11:30'],
+        )
+
+    def test_manage_reminders(self):
+        for appointment in self.appointments:
+            for hours_before in (2, 24):
+                AppointmentReminder.objects.create(
+                    appointment=appointment, hours_before=hours_before,
+                    scheduled_for=timezone.now(),
+                )
+        self.client.force_login(self.patient)
+        with self.assertNumQueries(5):
+            response = self.client.get(reverse('manage_reminders'))
+        self.assertContains(response, 'name="reminder_id"', count=6)
+
+
+class ReminderOwnershipTests(AppointmentTestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        cls.reminder = AppointmentReminder.objects.create(
+            appointment=cls.appointments[0], scheduled_for=timezone.now()
+        )
+        cls.other = User.objects.create_user('other', 'other@example.com', 'pw')
+
+    def post_reminders(self, data):
+        return self.client.post(reverse('manage_reminders'), data)
+
+    def test_cannot_delete_someone_elses_reminder(self):
+        self.client.force_login(self.other)
+        self.post_reminders({'action': 'delete_reminder', 'reminder_id': self.reminder.id})
+        self.assertTrue(AppointmentReminder.objects.filter(pk=self.reminder.pk).exists())
+
+    def test_cannot_add_reminder_to_someone_elses_appointment(self):
+        self.client.force_login(self.other)
+        response = self.post_reminders({
+            'action': 'add_reminder', 'appointment_id': self.appointments[0].id,
+            'hours_before': '2',
+        })
+        self.assertEqual(response.status_code, 404)
+        self.assertEqual(AppointmentReminder.objects.count(), 1)
+
+    def test_patient_deletes_own_reminder(self):
+        self.client.force_login(self.patient)
+        self.post_reminders({'action': 'delete_reminder', 'reminder_id': self.reminder.id})
+        self.assertFalse(AppointmentReminder.objects.exists())
+
+    def test_doctor_adds_reminder_to_own_appointment(self):
+        self.client.force_login(self.doctor_user)
+        self.post_reminders({
+            'action': 'add_reminder', 'appointment_id': self.appointments[1].id,
+            'hours_before': '2',
+        })
+        self.assertTrue(
+            AppointmentReminder.objects.filter(appointment=self.appointments[1]).exists()
+        )
@@ -4,20 +4,60 @@ from django.contrib.auth.models import User
 from django.contrib.auth import login
 from django.contrib import messages
 from django.http import JsonResponse, HttpResponseForbidden, HttpResponse
-from django.db.models import Q, Count, Avg
+from django.db import IntegrityError, connection, transaction
+from django.db.models import Q, Count, Avg, Exists, Prefetch
+from django.db.models.functions import TruncDate
 from django.utils import timezone
 from django.contrib.auth.tokens import default_token_generator
 from django.utils.http import urlsafe_base64_encode, urlsafe_base64_decode
 from django.utils.encoding import force_bytes, force_str
 from django.urls import reverse
-from django.core.mail import send_mail
-from django.conf import settings
+from django.core.cache import cache
+from django.core.paginator import Paginator
 from django.views.decorators.csrf import ensure_csrf_cookie
-from datetime import datetime, timedelta
+from datetime import datetime, time as dt_time, timedelta
 import json
-
-from .models import Doctor, Appointment, Profile, Notification, StatusHistory, DoctorSchedule, PatientNotes, Review, AppointmentReminder, TimeBlock
-
+import re
+
+from .models import ACTIVE_STATUSES, Doctor, Appointment, Profile, Notification, StatusHistory, DoctorSchedule, PatientNotes, Review, AppointmentReminder, TimeBlock
+from .responses import FastJsonResponse, dumps
+from .tasks import send_activation_email_task, send_pending_reminders as send_due_reminders
+from .signals import (
+    SPECIALIZATIONS_CACHE_KEY, UNREAD_NOTIFICATIONS_CACHE_KEY, collect_notifications, create_notification, create_status_history, queue_status_change_email,
+)
+
+# Rows per page on the dashboards, in search results and on review lists
+DASHBOARD_PAGE_SIZE = 25
+SEARCH_PAGE_SIZE = 20
+REVIEWS_PAGE_SIZE = 10
+
+# Display labels and allowed values for request input, built once at import
+STATUS_LABELS = dict(Appointment.STATUS_CHOICES)
+PRIORITY_LABELS = dict(Appointment.PRIORITY_CHOICES)
+VALID_STATUSES = frozenset(STATUS_LABELS)
+VALID_PRIORITIES = frozenset(PRIORITY_LABELS)
+
+# DoctorSchedule.day_of_week values, indexed by date.weekday()
+DAY_NAMES = tuple(day for day, _ in DoctorSchedule.DAYS_OF_WEEK)
+
+# Calendar event color per status
+STATUS_COLORS = {
+    'pending': '#f59e0b',
+    'approved': '#3b82f6',
+    'scheduled': '#10b981',
+    'completed': '#6b7280',
+    'cancelled': '#ef4444',
+    'rescheduled': '#8b5cf6',
+    'no_show': '#f97316',
+    'rejected': '#dc2626',
+}
+
+# Extra field written when an appointment moves into a status
+STATUS_SIDE_EFFECTS = {
+    'approved': 'confirmed_at',
+    'completed': 'completed_at',
+    'cancelled': 'cancellation_reason',
+}
 
 # ---------------- HELPER FUNCTIONS ----------------
 
@@ -26,9 +66,10 @@ def get_doctor_for_user(user):
     Get the Doctor instance linked to a user.
     Uses the new user ForeignKey relationship, with fallback to name matching for legacy data.
     """
-    # First try the proper user relationship
+    # First try the proper user relationship; ProfileModelBackend loads it with
+    # request.user, and the reverse accessor caches the result (or its absence)
     try:
-        return Doctor.objects.get(user=user)
+        return user.doctor_profile
     except Doctor.DoesNotExist:
         pass
     
@@ -39,30 +80,95 @@ def get_doctor_for_user(user):
         return None
 
 
+def search_doctors(doctors, query):
+    """
+    Filter doctors by name or specialization. On PostgreSQL this is a
+    prefix full-text match served by the doctor_search_idx GIN index and
+    ordered by rank; other databases fall back to icontains.
+    """
+    terms = re.findall(r'\w+', query)
+    if connection.vendor != 'postgresql' or not terms:
+        return doctors.filter(
+            Q(name__icontains=query) |
+            Q(specialization__icontains=query)
+        )
+
+    from django.contrib.postgres.search import SearchQuery, SearchRank, SearchVector
+
+    # Must match the indexed expression in migration 0017
+    vector = SearchVector('name', 'specialization', config='simple')
+    search = SearchQuery(
+        ' & '.join(f'{term}:*' for term in terms), config='simple', search_type='raw'
+    )
+    return doctors.annotate(
+        search=vector, rank=SearchRank(vector, search)
+    ).filter(search=search).order_by('-rank')
+
+
+def split_slot_clashes(doctor, appointments):
+    """
+    Split appointments about to become active into those whose slot is free
+    and those whose slot another active appointment already holds.
+    """
+    selected = {appointment.pk for appointment in appointments}
+    # Slots kept by the selected appointments that are active already
+    held = {
+        (appointment.appointment_date, appointment.appointment_time)
+        for appointment in appointments
+        if appointment.status in ACTIVE_STATUSES
+    }
+    moving = [a for a in appointments if a.status not in ACTIVE_STATUSES]
+    if moving:
+        held.update(Appointment.objects.filter(
+            doctor=doctor,
+            appointment_date__in={appointment.appointment_date for appointment in moving},
+            status__in=ACTIVE_STATUSES,
+        ).exclude(pk__in=selected).values_list('appointment_date', 'appointment_time'))
+
+    free, clashing = [], []
+    for appointment in appointments:
+        slot = (appointment.appointment_date, appointment.appointment_time)
+        if appointment.status in ACTIVE_STATUSES:
+            free.append(appointment)
+        elif slot in held:
+            clashing.append(appointment)
+        else:
+            # The first selected appointment to claim a slot gets it
+            held.add(slot)
+            free.append(appointment)
+    return free, clashing
+
+
+def get_status_change_fields(new_status, reason, now):
+    """Field values to write for a status change, shared by the single and bulk updates"""
+    fields = {'status': new_status, 'updated_at': now}
+    extra = STATUS_SIDE_EFFECTS.get(new_status)
+    if extra:
+        fields[extra] = reason if extra == 'cancellation_reason' else now
+    return fields
+
+
 # ---------------- HOME ----------------
 
+def get_home_stats():
+    """Site-wide counters for the landing page"""
+    return {
+        'total_appointments': Appointment.objects.count(),
+        'total_doctors': Doctor.objects.filter(is_active=True).count(),
+        'upcoming_appointments': Appointment.objects.filter(
+            appointment_date__gte=timezone.now().date(),
+            status__in=['approved', 'scheduled']
+        ).count(),
+    }
+
+
 def home(request):
-    total_appointments = Appointment.objects.count()
-    total_doctors = Doctor.objects.filter(is_active=True).count()
-    upcoming_appointments = Appointment.objects.filter(
-        appointment_date__gte=timezone.now().date(),
-        status__in=['approved', 'scheduled']
-    ).count()
+    # Headline numbers don't need to be fresher than a minute
+    context = dict(cache.get_or_set('home_stats', get_home_stats, 60))
 
     featured_doctors = Doctor.objects.filter(is_active=True)[:6]
 
-    # 🔹 ADD THIS
-    unread_notifications = 0
-    if request.user.is_authenticated:
-        unread_notifications = request.user.notifications.filter(is_read=False).count()
-
-    context = {
-        'total_appointments': total_appointments,
-        'total_doctors': total_doctors,
-        'upcoming_appointments': upcoming_appointments,
-        'featured_doctors': featured_doctors,
-        'unread_notifications': unread_notifications,  # ✅
-    }
+    context['featured_doctors'] = featured_doctors
 
     return render(request, 'home_enhanced.html', context)
 
@@ -74,33 +180,32 @@ def doctors(request):
     specialization = request.GET.get('specialization', '')
     search_query = request.GET.get('search', '')
     
-    doctors = Doctor.objects.filter(is_active=True)
+    # Only the columns the doctor cards render
+    doctors = Doctor.objects.filter(is_active=True).only(
+        'id', 'name', 'specialization', 'available_from', 'available_to',
+        'average_rating', 'total_reviews', 'experience_years', 'consultation_fee',
+    )
     
     if specialization:
         doctors = doctors.filter(specialization=specialization)
     
     if search_query:
-        doctors = doctors.filter(
-            Q(name__icontains=search_query) | 
-            Q(specialization__icontains=search_query)
-        )
-    
-    # Get available specializations
-    specializations = Doctor.objects.filter(is_active=True).values_list(
-        'specialization', flat=True
-    ).distinct().order_by('specialization')
-    
-    # Get unread notifications count
-    unread_notifications = 0
-    if request.user.is_authenticated:
-        unread_notifications = request.user.notifications.filter(is_read=False).count()
+        doctors = search_doctors(doctors, search_query)
+    
+    # Get available specializations (cached; cleared when a doctor changes)
+    specializations = cache.get_or_set(
+        SPECIALIZATIONS_CACHE_KEY,
+        lambda: list(Doctor.objects.filter(is_active=True).values_list(
+            'specialization', flat=True
+        ).distinct().order_by('specialization')),
+        300,
+    )
     
     context = {
         'doctors': doctors,
         'specializations': specializations,
         'current_specialization': specialization,
         'search_query': search_query,
-        'unread_notifications': unread_notifications,
     }
     return render(request, 'doctors.html', context)
 
@@ -118,45 +223,39 @@ def book_appointment(request, doctor_id):
         messages.error(request, "User profile not found. Please contact support.")
         return redirect('home')
 
-    doctor = get_object_or_404(Doctor, id=doctor_id)
+    # Preload the doctor's user and profile; the appointment_created signal
+    # notifies that user and checks their email preference
+    doctor = get_object_or_404(Doctor.objects.select_related('user__profile'), id=doctor_id)
 
     if request.method == 'POST':
         date = request.POST.get('date')
         time = request.POST.get('time')
         reason = request.POST.get('reason', '')
         priority = request.POST.get('priority', 'normal')
+        if priority not in VALID_PRIORITIES:
+            priority = 'normal'
 
         # Validate input
         if not date or not time:
             messages.error(request, "All fields are required.")
             return redirect('book', doctor_id=doctor.id)
 
-        # Check for time conflicts
-        conflict_exists = Appointment.objects.filter(
-            doctor=doctor,
-            appointment_date=date,
-            appointment_time=time,
-            status__in=['pending', 'approved', 'scheduled']
-        ).exists()
-
-        if conflict_exists:
-            messages.error(request, "This time slot is already booked. Please choose another time.")
-            return redirect('book', doctor_id=doctor.id)
-
         try:
-            # Create appointment
-            appointment = Appointment.objects.create(
-                patient_name=request.user.username,
-                patient_email=request.user.email,
-                patient_phone=profile.phone,
-                doctor=doctor,
-                appointment_date=date,
-                appointment_time=time,
-                reason=reason,
-                priority=priority,
-                status='pending',
-                user=request.user
-            )
+            # Create appointment; the unique_active_slot constraint rejects a
+            # slot that is already taken, even under concurrent bookings
+            with transaction.atomic():
+                appointment = Appointment.objects.create(
+                    patient_name=request.user.username,
+                    patient_email=request.user.email,
+                    patient_phone=profile.phone,
+                    doctor=doctor,
+                    appointment_date=date,
+                    appointment_time=time,
+                    reason=reason,
+                    priority=priority,
+                    status='pending',
+                    user=request.user
+                )
 
             # Note: Notification creation is handled by signals.py post_save signal
             # No need to create notification here to avoid duplicates
@@ -167,6 +266,9 @@ def book_appointment(request, doctor_id):
             )
             return redirect('patient_dashboard')
             
+        except IntegrityError:
+            messages.error(request, "This time slot is already booked. Please choose another time.")
+            return redirect('book', doctor_id=doctor.id)
         except Exception as e:
             # Log the error and show a user-friendly message
             messages.error(
@@ -178,15 +280,9 @@ def book_appointment(request, doctor_id):
     # Get available time slots for the doctor
     available_slots = get_available_time_slots(doctor, request.GET.get('date'))
     
-    # Get unread notifications count
-    unread_notifications = 0
-    if request.user.is_authenticated:
-        unread_notifications = request.user.notifications.filter(is_read=False).count()
-    
     context = {
         'doctor': doctor,
         'available_slots': available_slots,
-        'unread_notifications': unread_notifications,
     }
     return render(request, 'book.html', context)
 
@@ -204,9 +300,12 @@ def patient_dashboard(request):
         messages.error(request, "User profile not found.")
         return redirect('home')
 
-    # Get patient's appointments
+    # Get patient's appointments (only the columns the dashboard renders)
     appointments = Appointment.objects.filter(
         user=request.user
+    ).select_related('doctor').only(
+        'id', 'appointment_date', 'appointment_time', 'status', 'reason',
+        'doctor__name', 'doctor__specialization',
     ).order_by('-created_at')
 
     # Filter by status if requested
@@ -219,35 +318,34 @@ def patient_dashboard(request):
         user=request.user
     ).order_by('-created_at')[:10]
 
-    # Get upcoming appointments (include pending since they are awaiting approval)
-    upcoming_appointments = appointments.filter(
-        appointment_date__gte=timezone.now().date(),
-        status__in=['pending', 'approved', 'scheduled']
+    # Statistics - pass as list for template (one aggregate query for all
+    # counts; upcoming includes pending since they are awaiting approval)
+    counts = appointments.aggregate(
+        total=Count('id'),
+        upcoming=Count('id', filter=Q(
+            appointment_date__gte=timezone.now().date(),
+            status__in=ACTIVE_STATUSES
+        )),
+        completed=Count('id', filter=Q(status='completed')),
+        cancelled=Count('id', filter=Q(status='cancelled')),
     )
-
-    # Statistics - pass as list for template
-    total_appointments = appointments.count()
-    completed_appointments = appointments.filter(status='completed').count()
-    cancelled_appointments = appointments.filter(status='cancelled').count()
-    pending_appointments = appointments.filter(status='pending').count()
     
     stats = [
-        {'title': 'Total Appointments', 'value': total_appointments, 'icon': 'calendar-check', 'color': 'blue'},
-        {'title': 'Upcoming', 'value': upcoming_appointments.count(), 'icon': 'calendar-alt', 'color': 'yellow'},
-        {'title': 'Completed', 'value': completed_appointments, 'icon': 'check-circle', 'color': 'green'},
-        {'title': 'Cancelled', 'value': cancelled_appointments, 'icon': 'times-circle', 'color': 'red'},
+        {'title': 'Total Appointments', 'value': counts['total'], 'icon': 'calendar-check', 'color': 'blue'},
+        {'title': 'Upcoming', 'value': counts['upcoming'], 'icon': 'calendar-alt', 'color': 'yellow'},
+        {'title': 'Completed', 'value': counts['completed'], 'icon': 'check-circle', 'color': 'green'},
+        {'title': 'Cancelled', 'value': counts['cancelled'], 'icon': 'times-circle', 'color': 'red'},
     ]
 
-    # Get unread notifications count
-    unread_notifications = request.user.notifications.filter(is_read=False).count()
+    # Render one page of the history; the counts above cover all of it
+    page_obj = Paginator(appointments, DASHBOARD_PAGE_SIZE).get_page(request.GET.get('page'))
 
     context = {
-        'appointments': appointments,
+        'appointments': page_obj,
+        'page_obj': page_obj,
         'notifications': notifications,
-        'upcoming_appointments': upcoming_appointments,
         'stats': stats,
         'status_filter': status_filter,
-        'unread_notifications': unread_notifications,
     }
     return render(request, 'patient_dashboard.html', context)
 
@@ -270,8 +368,12 @@ def doctor_dashboard(request):
         messages.error(request, "Doctor profile not found. Please contact support.")
         return redirect('home')
     
+    # Only the columns the dashboard renders
     appointments = Appointment.objects.filter(
         doctor=doctor
+    ).only(
+        'id', 'patient_name', 'patient_email', 'patient_phone', 'appointment_date',
+        'appointment_time', 'status', 'priority', 'reason', 'notes', 'created_at',
     ).order_by('-created_at')
 
     # Filter by status if requested
@@ -284,39 +386,47 @@ def doctor_dashboard(request):
         user=request.user
     ).order_by('-created_at')[:10]
 
-    # Get upcoming appointments
-    upcoming_appointments = appointments.filter(
-        appointment_date__gte=timezone.now().date(),
-        status__in=['approved', 'scheduled']
+    # Statistics (one aggregate query for all counts)
+    counts = appointments.aggregate(
+        total=Count('id'),
+        pending=Count('id', filter=Q(status='pending')),
+        completed=Count('id', filter=Q(status='completed')),
+        today=Count('id', filter=Q(
+            appointment_date=timezone.now().date(),
+            status__in=ACTIVE_STATUSES
+        )),
     )
-
-    # Statistics
-    total_appointments = appointments.count()
-    pending_appointments = appointments.filter(status='pending').count()
-    completed_appointments = appointments.filter(status='completed').count()
-    todays_appointments = appointments.filter(
-        appointment_date=timezone.now().date(),
-        status__in=['pending', 'approved', 'scheduled']
-    ).count()
+    total_appointments = counts['total']
+    pending_appointments = counts['pending']
+    completed_appointments = counts['completed']
+    todays_appointments = counts['today']
 
     # Recent activity
     recent_appointments = appointments[:5]
 
-    # Get unread notifications count
-    unread_notifications = request.user.notifications.filter(is_read=False).count()
+    # Search the list by patient name or reason in the database, so matches
+    # beyond the current page are found
+    query = request.GET.get('q', '').strip()
+    listed = appointments
+    if query:
+        listed = listed.filter(Q(patient_name__icontains=query) | Q(reason__icontains=query))
+
+    # Render one page of the list; the counts above cover all of it
+    page_obj = Paginator(listed, DASHBOARD_PAGE_SIZE).get_page(request.GET.get('page'))
 
     context = {
-        'appointments': appointments,
+        'appointments': page_obj,
+        'page_obj': page_obj,
         'notifications': notifications,
-        'upcoming_appointments': upcoming_appointments,
         'recent_appointments': recent_appointments,
         'total_appointments': total_appointments,
         'pending_appointments': pending_appointments,
         'completed_appointments': completed_appointments,
         'todays_appointments': todays_appointments,
         'status_filter': status_filter,
+        'status_choices': Appointment.STATUS_CHOICES,
+        'query': query,
         'doctor': doctor,
-        'unread_notifications': unread_notifications,
     }
     return render(request, 'doctor_dashboard.html', context)
 
@@ -328,7 +438,11 @@ def update_appointment_status(request, appointment_id):
     if request.method != 'POST':
         return JsonResponse({'error': 'Method not allowed'}, status=405)
 
-    appointment = get_object_or_404(Appointment, id=appointment_id)
+    # The patient's user and profile are read when the status notification is created
+    appointment = get_object_or_404(
+        Appointment.objects.with_signal_context(),
+        id=appointment_id
+    )
     
     # Check permissions
     try:
@@ -353,44 +467,46 @@ def update_appointment_status(request, appointment_id):
     reason = request.POST.get('reason', '')
 
     # Validate status transition
-    if new_status not in dict(Appointment.STATUS_CHOICES):
+    if new_status not in VALID_STATUSES:
         return JsonResponse({'error': 'Invalid status'}, status=400)
 
     old_status = appointment.status
-    appointment.status = new_status
-    appointment.updated_at = timezone.now()
-
-    # Set additional timestamps based on status
-    if new_status == 'approved':
-        appointment.confirmed_at = timezone.now()
-    elif new_status == 'completed':
-        appointment.completed_at = timezone.now()
-    elif new_status == 'cancelled':
-        appointment.cancellation_reason = reason
-
-    appointment.save()
-
-    # Create status history record
-    StatusHistory.objects.create(
-        appointment=appointment,
-        old_status=old_status,
-        new_status=new_status,
-        changed_by=request.user,
-        reason=reason
-    )
+    fields = get_status_change_fields(new_status, reason, timezone.now())
+    for name, value in fields.items():
+        setattr(appointment, name, value)
+    update_fields = list(fields)
+
+    # One transaction for the row update and its history row; the
+    # notification is written after commit, and the emails then share one
+    # SMTP connection
+    try:
+        with transaction.atomic(), collect_notifications():
+            appointment.save(update_fields=update_fields)
 
-    # Create notifications
-    if new_status != old_status:
-        # Notify patient
-        if appointment.user:
-            Notification.objects.create(
-                user=appointment.user,
+            # Create status history record
+            create_status_history(
                 appointment=appointment,
-                type='status_changed',
-                title=f'Appointment Status Updated',
-                message=f'Your appointment status has been changed from {old_status} to {new_status}.'
+                old_status=old_status,
+                new_status=new_status,
+                changed_by=request.user,
+                reason=reason
             )
 
+            # Create notifications
+            if new_status != old_status:
+                # Notify patient
+                if appointment.user:
+                    create_notification(
+                        user=appointment.user,
+                        appointment=appointment,
+                        type='status_changed',
+                        title=f'Appointment Status Updated',
+                        message=f'Your appointment status has been changed from {old_status} to {new_status}.'
+                    )
+    except IntegrityError:
+        # Reactivating an appointment whose slot has since been rebooked
+        return JsonResponse({'error': 'This time slot is already taken'}, status=409)
+
     return JsonResponse({
         'success': True,
         'new_status': new_status,
@@ -401,7 +517,7 @@ def update_appointment_status(request, appointment_id):
 @login_required
 def reschedule_appointment(request, appointment_id):
     """Reschedule an appointment"""
-    appointment = get_object_or_404(Appointment, id=appointment_id)
+    appointment = get_object_or_404(Appointment.objects.with_signal_context(), id=appointment_id)
     
     # Check permissions
     if appointment.user != request.user:
@@ -415,46 +531,62 @@ def reschedule_appointment(request, appointment_id):
         new_date = request.POST.get('date')
         new_time = request.POST.get('time')
 
-        # Check for conflicts
-        conflict_exists = Appointment.objects.filter(
-            doctor=appointment.doctor,
-            appointment_date=new_date,
-            appointment_time=new_time,
-            status__in=['pending', 'approved', 'scheduled']
-        ).exclude(id=appointment.id).exists()
-
-        if conflict_exists:
+        try:
+            with transaction.atomic():
+                # Lock this appointment's row so two submits for it can't both
+                # pass the status check; it does not stop another appointment
+                # taking the same slot, which unique_active_slot rejects below
+                appointment = Appointment.objects.with_signal_context().select_for_update(
+                    of=('self',)
+                ).get(pk=appointment.pk)
+                if not appointment.can_be_rescheduled():
+                    messages.error(request, "This appointment cannot be rescheduled.")
+                    return redirect('patient_dashboard')
+
+                # Check for conflicts (SELECT 1 ... LIMIT 1 on the slot index) to
+                # catch the common case early; a concurrent booking of the slot
+                # can still pass it and fails on the constraint instead
+                conflict_exists = Appointment.objects.filter(
+                    doctor_id=appointment.doctor_id,
+                    appointment_date=new_date,
+                    appointment_time=new_time,
+                    status__in=ACTIVE_STATUSES
+                ).exclude(id=appointment.id).exists()
+
+                if conflict_exists:
+                    messages.error(request, "The selected time slot is not available.")
+                    return redirect('reschedule_appointment', appointment_id=appointment.id)
+
+                # Update appointment
+                old_date = appointment.appointment_date
+                old_time = appointment.appointment_time
+            
+                appointment.appointment_date = new_date
+                appointment.appointment_time = new_time
+                appointment.status = 'rescheduled'
+                appointment.updated_at = timezone.now()
+                appointment.save(update_fields=[
+                    'appointment_date', 'appointment_time', 'status', 'updated_at'
+                ])
+
+                # Create history record
+                StatusHistory.objects.create(
+                    appointment=appointment,
+                    old_status='scheduled',
+                    new_status='rescheduled',
+                    changed_by=request.user,
+                    reason=f'Rescheduled from {old_date} {old_time} to {new_date} {new_time}'
+                )
+        except IntegrityError:
+            # Another booking or reschedule took the slot after the check above
             messages.error(request, "The selected time slot is not available.")
             return redirect('reschedule_appointment', appointment_id=appointment.id)
 
-        # Update appointment
-        old_date = appointment.appointment_date
-        old_time = appointment.appointment_time
-        
-        appointment.appointment_date = new_date
-        appointment.appointment_time = new_time
-        appointment.status = 'rescheduled'
-        appointment.updated_at = timezone.now()
-        appointment.save()
-
-        # Create history record
-        StatusHistory.objects.create(
-            appointment=appointment,
-            old_status='scheduled',
-            new_status='rescheduled',
-            changed_by=request.user,
-            reason=f'Rescheduled from {old_date} {old_time} to {new_date} {new_time}'
-        )
-
         messages.success(request, "Appointment rescheduled successfully!")
         return redirect('patient_dashboard')
 
-    # Get unread notifications count
-    unread_notifications = request.user.notifications.filter(is_read=False).count()
-
     return render(request, 'reschedule_appointment.html', {
         'appointment': appointment,
-        'unread_notifications': unread_notifications
     })
 
 
@@ -464,7 +596,7 @@ def mark_notification_read(request, notification_id):
     """Mark a notification as read"""
     notification = get_object_or_404(Notification, id=notification_id, user=request.user)
     notification.is_read = True
-    notification.save()
+    notification.save(update_fields=['is_read'])
     
     if request.headers.get('x-requested-with') == 'XMLHttpRequest':
         return JsonResponse({'success': True})
@@ -476,6 +608,8 @@ def mark_notification_read(request, notification_id):
 def mark_all_notifications_read(request):
     """Mark all notifications as read"""
     Notification.objects.filter(user=request.user, is_read=False).update(is_read=True)
+    # update() skips post_save, so clear the cached navbar count here
+    cache.delete(UNREAD_NOTIFICATIONS_CACHE_KEY.format(request.user.pk))
     
     if request.headers.get('x-requested-with') == 'XMLHttpRequest':
         return JsonResponse({'success': True})
@@ -502,7 +636,7 @@ def get_available_slots(request):
         return JsonResponse({'error': 'Doctor not found'}, status=404)
 
     slots = get_available_time_slots(doctor, date)
-    return JsonResponse({'slots': slots})
+    return FastJsonResponse({'slots': slots})
 
 
 @login_required
@@ -512,15 +646,21 @@ def get_appointment_details(request, appointment_id):
         return JsonResponse({'error': 'Method not allowed'}, status=405)
 
     try:
-        appointment = Appointment.objects.get(id=appointment_id)
+        # History and who made each change come in one extra query
+        appointment = Appointment.objects.prefetch_related(
+            Prefetch(
+                'status_history',
+                queryset=StatusHistory.objects.select_related('changed_by'),
+            )
+        ).get(id=appointment_id)
         
-        # Check permissions
+        # Check permissions (compare ids so neither side is fetched)
         profile = request.user.profile
-        if profile.role == 'patient' and appointment.user != request.user:
+        if profile.role == 'patient' and appointment.user_id != request.user.id:
             return JsonResponse({'error': 'Permission denied'}, status=403)
         elif profile.role == 'doctor':
             doctor = get_doctor_for_user(request.user)
-            if not doctor or appointment.doctor != doctor:
+            if not doctor or appointment.doctor_id != doctor.id:
                 return JsonResponse({'error': 'Permission denied'}, status=403)
         
         # Prepare response data
@@ -551,7 +691,7 @@ def get_appointment_details(request, appointment_id):
             }
         }
         
-        return JsonResponse(data)
+        return FastJsonResponse(data)
         
     except Appointment.DoesNotExist:
         return JsonResponse({'error': 'Appointment not found'}, status=404)
@@ -601,22 +741,32 @@ def search_appointments(request):
     if date_to:
         appointments = appointments.filter(appointment_date__lte=date_to)
 
-    appointments = appointments.order_by('-created_at')[:20]
+    # Fetch just the serialized columns as dicts; doctor__name joins the doctor
+    appointments = appointments.values(
+        'id', 'patient_name', 'doctor__name', 'appointment_date',
+        'appointment_time', 'status', 'priority',
+    ).order_by('-created_at')
+    page_obj = Paginator(appointments, SEARCH_PAGE_SIZE).get_page(request.GET.get('page'))
 
     # Serialize results
     results = []
-    for appointment in appointments:
+    for appointment in page_obj:
         results.append({
-            'id': appointment.id,
-            'patient_name': appointment.patient_name,
-            'doctor_name': appointment.doctor.name,
-            'appointment_date': appointment.appointment_date.strftime('%Y-%m-%d'),
-            'appointment_time': appointment.appointment_time.strftime('%H:%M'),
-            'status': appointment.status,
-            'priority': appointment.priority,
+            'id': appointment['id'],
+            'patient_name': appointment['patient_name'],
+            'doctor_name': appointment['doctor__name'],
+            'appointment_date': appointment['appointment_date'].strftime('%Y-%m-%d'),
+            'appointment_time': appointment['appointment_time'].strftime('%H:%M'),
+            'status': appointment['status'],
+            'priority': appointment['priority'],
         })
 
-    return JsonResponse({'appointments': results})
+    return FastJsonResponse({
+        'appointments': results,
+        'page': page_obj.number,
+        'num_pages': page_obj.paginator.num_pages,
+        'has_next': page_obj.has_next(),
+    })
 
 
 # ---------------- BULK OPERATIONS ----------------
@@ -640,64 +790,70 @@ def bulk_update_appointments(request):
     if not appointment_ids or not new_status:
         return JsonResponse({'error': 'Appointment IDs and new status are required'}, status=400)
 
-    if new_status not in dict(Appointment.STATUS_CHOICES):
+    if new_status not in VALID_STATUSES:
         return JsonResponse({'error': 'Invalid status'}, status=400)
 
     doctor = get_doctor_for_user(request.user)
     if not doctor:
         return JsonResponse({'error': 'Doctor profile not found'}, status=404)
     
-    updated_count = 0
+    fields = get_status_change_fields(new_status, reason, timezone.now())
 
-    for appointment_id in appointment_ids:
-        try:
-            appointment = Appointment.objects.get(
-                id=appointment_id,
-                doctor=doctor
-            )
-            
-            old_status = appointment.status
-            appointment.status = new_status
-            appointment.updated_at = timezone.now()
-
-            # Set additional timestamps
-            if new_status == 'approved':
-                appointment.confirmed_at = timezone.now()
-            elif new_status == 'completed':
-                appointment.completed_at = timezone.now()
-            elif new_status == 'cancelled':
-                appointment.cancellation_reason = reason
-
-            appointment.save()
-
-            # Create history record
-            StatusHistory.objects.create(
-                appointment=appointment,
-                old_status=old_status,
-                new_status=new_status,
-                changed_by=request.user,
-                reason=reason or f'Bulk update: {old_status} → {new_status}'
-            )
+    # One SELECT for the selected rows and one UPDATE for all of them; history
+    # and notification rows are inserted in one batch per model at the end
+    appointments = list(Appointment.objects.with_signal_context().filter(
+        id__in=appointment_ids,
+        doctor=doctor
+    ))
+    skipped = []
+    if new_status in ACTIVE_STATUSES:
+        # Leave out the appointments whose slot has been rebooked meanwhile
+        # rather than failing the whole batch on the unique constraint
+        appointments, skipped = split_slot_clashes(doctor, appointments)
 
-            # Create notification
-            if appointment.user:
-                Notification.objects.create(
-                    user=appointment.user,
-                    appointment=appointment,
-                    type='status_changed',
-                    title='Appointment Status Updated',
-                    message=f'Your appointment has been {new_status} (bulk update).'
-                )
+    try:
+        with transaction.atomic(), collect_notifications():
+            updated_count = Appointment.objects.filter(
+                pk__in=[appointment.pk for appointment in appointments]
+            ).update(**fields)
 
-            updated_count += 1
+            for appointment in appointments:
+                old_status = appointment.status
 
-        except Appointment.DoesNotExist:
-            continue
+                # Create history record
+                create_status_history(
+                    appointment=appointment,
+                    old_status=old_status,
+                    new_status=new_status,
+                    changed_by=request.user,
+                    reason=reason or f'Bulk update: {old_status} → {new_status}'
+                )
 
+                # Create notification
+                if appointment.user:
+                    create_notification(
+                        user=appointment.user,
+                        appointment=appointment,
+                        type='status_changed',
+                        title='Appointment Status Updated',
+                        message=f'Your appointment has been {new_status} (bulk update).'
+                    )
+
+                # update() skips post_save, so queue the status email it would send
+                if old_status != new_status:
+                    queue_status_change_email(appointment.pk)
+    except IntegrityError:
+        # A slot was booked between the clash check and the update
+        return JsonResponse({'error': 'This time slot is already taken'}, status=409)
+
+    message = f'Successfully updated {updated_count} appointments'
+    if skipped:
+        message += f'; skipped {len(skipped)} whose time slot is already taken'
     return JsonResponse({
         'success': True,
         'updated_count': updated_count,
-        'message': f'Successfully updated {updated_count} appointments'
+        'skipped_ids': [appointment.pk for appointment in skipped],
+        'message': message
     })
 
 
@@ -736,7 +892,8 @@ def export_appointments(request):
     if date_to:
         appointments = appointments.filter(appointment_date__lte=date_to)
 
-    appointments = appointments.order_by('-created_at')
+    # Every exported row reads appointment.doctor.name; join it up front
+    appointments = appointments.select_related('doctor').order_by('-created_at')
 
     if format_type == 'csv':
         return export_to_csv(appointments)
@@ -746,58 +903,74 @@ def export_appointments(request):
         return JsonResponse({'error': 'Unsupported format'}, status=400)
 
 
+class Echo:
+    """File-like object whose write() hands the row back for streaming"""
+    def write(self, value):
+        return value
+
+
 def export_to_csv(appointments):
     """Export appointments to CSV format"""
     import csv
-    from django.http import HttpResponse
-
-    response = HttpResponse(content_type='text/csv')
-    response['Content-Disposition'] = f'attachment; filename="appointments_{timezone.now().strftime("%Y%m%d_%H%M%S")}.csv"'
+    from django.http import StreamingHttpResponse
 
-    writer = csv.writer(response)
-    writer.writerow([
-        'ID', 'Patient Name', 'Patient Email', 'Doctor', 'Date', 'Time', 
-        'Status', 'Priority', 'Reason', 'Created At'
-    ])
+    writer = csv.writer(Echo())
 
-    for appointment in appointments:
-        writer.writerow([
-            appointment.id,
-            appointment.patient_name,
-            appointment.patient_email,
-            appointment.doctor.name,
-            appointment.appointment_date,
-            appointment.appointment_time,
-            appointment.get_status_display(),
-            appointment.get_priority_display(),
-            appointment.reason or '',
-            appointment.created_at.strftime('%Y-%m-%d %H:%M:%S')
+    def rows():
+        yield writer.writerow([
+            'ID', 'Patient Name', 'Patient Email', 'Doctor', 'Date', 'Time', 
+            'Status', 'Priority', 'Reason', 'Created At'
         ])
-
+        # Stream in chunks so large exports never sit in memory all at once
+        for appointment in appointments.iterator(chunk_size=2000):
+            yield writer.writerow([
+                appointment.id,
+                appointment.patient_name,
+                appointment.patient_email,
+                appointment.doctor.name,
+                appointment.appointment_date,
+                appointment.appointment_time,
+                appointment.get_status_display(),
+                appointment.get_priority_display(),
+                appointment.reason or '',
+                appointment.created_at.strftime('%Y-%m-%d %H:%M:%S')
+            ])
+
+    response = StreamingHttpResponse(rows(), content_type='text/csv')
+    response['Content-Disposition'] = f'attachment; filename="appointments_{timezone.now().strftime("%Y%m%d_%H%M%S")}.csv"'
     return response
 
 
 def export_to_json(appointments):
     """Export appointments to JSON format"""
-    from django.http import JsonResponse
-    import json
+    from django.http import StreamingHttpResponse
 
-    data = []
-    for appointment in appointments:
-        data.append({
-            'id': appointment.id,
-            'patient_name': appointment.patient_name,
-            'patient_email': appointment.patient_email,
-            'doctor_name': appointment.doctor.name,
-            'appointment_date': appointment.appointment_date.strftime('%Y-%m-%d'),
-            'appointment_time': appointment.appointment_time.strftime('%H:%M'),
-            'status': appointment.get_status_display(),
-            'priority': appointment.get_priority_display(),
-            'reason': appointment.reason,
-            'created_at': appointment.created_at.strftime('%Y-%m-%d %H:%M:%S'),
-        })
+    # Plain dicts straight from the cursor; doctor__name is a JOIN
+    rows = appointments.values(
+        'id', 'patient_name', 'patient_email', 'doctor__name', 'appointment_date',
+        'appointment_time', 'status', 'priority', 'reason', 'created_at',
+    )
 
-    response = JsonResponse({'appointments': data})
+    def content():
+        yield b'{"appointments":['
+        # Stream in chunks so large exports never sit in memory all at once
+        for index, row in enumerate(rows.iterator(chunk_size=2000)):
+            item = dumps({
+                'id': row['id'],
+                'patient_name': row['patient_name'],
+                'patient_email': row['patient_email'],
+                'doctor_name': row['doctor__name'],
+                'appointment_date': row['appointment_date'].strftime('%Y-%m-%d'),
+                'appointment_time': row['appointment_time'].strftime('%H:%M'),
+                'status': STATUS_LABELS.get(row['status'], row['status']),
+                'priority': PRIORITY_LABELS.get(row['priority'], row['priority']),
+                'reason': row['reason'],
+                'created_at': row['created_at'].strftime('%Y-%m-%d %H:%M:%S'),
+            })
+            yield b',' + item if index else item
+        yield b']}'
+
+    response = StreamingHttpResponse(content(), content_type='application/json')
     response['Content-Disposition'] = f'attachment; filename="appointments_{timezone.now().strftime("%Y%m%d_%H%M%S")}.json"'
     return response
 
@@ -837,26 +1010,40 @@ def analytics_dashboard(request):
             created_at__date__lte=end_date
         )
 
-    # Calculate statistics
-    total_appointments = appointments.count()
+    # Calculate statistics with one GROUP BY per dimension instead of a COUNT per value
+    grouped_status = dict(
+        appointments.order_by().values_list('status').annotate(c=Count('id'))
+    )
+    total_appointments = sum(grouped_status.values())
     status_counts = {}
     for status, _ in Appointment.STATUS_CHOICES:
-        status_counts[status] = appointments.filter(status=status).count()
-
-    # Monthly trends
+        status_counts[status] = grouped_status.get(status, 0)
+
+    # Monthly trends: one GROUP BY over the charted days only, with days
+    # without appointments filled in with 0
+    trend_days = min(days, 30)
+    per_day = dict(
+        appointments.filter(
+            created_at__date__gt=end_date - timedelta(days=trend_days)
+        ).order_by().annotate(
+            day=TruncDate('created_at')
+        ).values_list('day').annotate(c=Count('id'))
+    )
     monthly_data = []
-    for i in range(min(days, 30)):
+    for i in range(trend_days):
         date = end_date - timedelta(days=i)
-        day_appointments = appointments.filter(created_at__date=date).count()
         monthly_data.append({
             'date': date.strftime('%Y-%m-%d'),
-            'appointments': day_appointments
+            'appointments': per_day.get(date, 0)
         })
 
     # Priority distribution
+    grouped_priority = dict(
+        appointments.order_by().values_list('priority').annotate(c=Count('id'))
+    )
     priority_counts = {}
     for priority, _ in Appointment.PRIORITY_CHOICES:
-        priority_counts[priority] = appointments.filter(priority=priority).count()
+        priority_counts[priority] = grouped_priority.get(priority, 0)
 
     # Success rate
     completed_appointments = status_counts.get('completed', 0)
@@ -885,23 +1072,44 @@ def analytics_dashboard(request):
 
 def get_top_doctors(start_date, end_date):
     """Get top performing doctors in the given period"""
-    from django.db.models import Count
+    # Half-open range on the raw column, so the (doctor, created_at) index
+    # applies; a __date lookup would wrap the column in a cast
+    start_dt = timezone.make_aware(datetime.combine(start_date, datetime.min.time()))
+    end_dt = timezone.make_aware(
+        datetime.combine(end_date + timedelta(days=1), datetime.min.time())
+    )
 
-    top_doctors = Doctor.objects.annotate(
+    top_doctors = Doctor.objects.values('id', 'name', 'specialization').annotate(
         appointment_count=Count('appointment', filter=Q(
-            appointment__created_at__date__gte=start_date,
-            appointment__created_at__date__lte=end_date
+            appointment__created_at__gte=start_dt,
+            appointment__created_at__lt=end_dt
         ))
     ).filter(appointment_count__gt=0).order_by('-appointment_count')[:5]
 
     return [{
-        'name': doctor.name,
-        'specialization': doctor.specialization,
-        'appointment_count': doctor.appointment_count
+        'name': doctor['name'],
+        'specialization': doctor['specialization'],
+        'appointment_count': doctor['appointment_count']
     } for doctor in top_doctors]
 
 
 # ---------------- UTILITY FUNCTIONS ----------------
+def get_signup_conflict(username, email):
+    """
+    Return 'username' or 'email' for the first field an existing account
+    already uses (username first), or None. One query covers both.
+    """
+    taken = User.objects.filter(Q(username=username) | Q(email=email)).aggregate(
+        username=Count('pk', filter=Q(username=username)),
+        email=Count('pk', filter=Q(email=email)),
+    )
+    if taken['username']:
+        return 'username'
+    if taken['email']:
+        return 'email'
+    return None
+
+
 def send_activation_email(request, user):
     """Send an activation email with a one-time verification link."""
     token = default_token_generator.make_token(user)
@@ -910,39 +1118,33 @@ def send_activation_email(request, user):
         reverse('activate_account', args=[uid, token])
     )
 
-    subject = "Verify your email to activate your account"
-    plain_message = (
-        f"Hi {user.username},\n\n"
-        f"Please verify your email to activate your account: {activation_url}\n\n"
-        "If you did not create an account, you can ignore this email."
+    # The URL needs the request; the SMTP work happens in the task, after
+    # the new user is committed
+    user_id = user.pk
+    transaction.on_commit(
+        lambda: send_activation_email_task(user_id, activation_url), robust=True
     )
 
-    html_message = f"""
-    <html>
-    <body style="font-family: Arial, sans-serif; color: #333;">
-        <div style="max-width: 600px; margin: 0 auto; padding: 20px;">
-            <h2 style="color: #2563eb;">Activate your account</h2>
-            <p>Hi {user.username},</p>
-            <p>Thanks for signing up. Please confirm your email to activate your account.</p>
-            <div style="margin: 24px 0; text-align: center;">
-                <a href="{activation_url}" style="background: #2563eb; color: white; padding: 12px 24px; text-decoration: none; border-radius: 6px;">Verify Email</a>
-            </div>
-            <p>If the button does not work, copy and paste this link into your browser:</p>
-            <p><a href="{activation_url}">{activation_url}</a></p>
-            <p style="color: #6b7280; font-size: 12px;">If you did not create an account, please ignore this message.</p>
-        </div>
-    </body>
-    </html>
-    """
 
-    send_mail(
-        subject,
-        plain_message,
-        settings.DEFAULT_FROM_EMAIL,
-        [user.email],
-        html_message=html_message,
-        fail_silently=False,
-    )
+def get_blocked_ranges(doctor, date_obj):
+    """
+    The doctor's time blocks overlapping a date, as (start, end) minute
+    offsets from that day's local midnight. Blocks spanning several days
+    extend past either end, so a slot is blocked when start <= minute < end.
+    """
+    day_start = timezone.make_aware(datetime.combine(date_obj, dt_time.min))
+    blocks = TimeBlock.objects.filter(
+        doctor=doctor,
+        start_datetime__lt=day_start + timedelta(days=1),
+        end_datetime__gt=day_start
+    ).only('start_datetime', 'end_datetime')
+    return [
+        (
+            (block.start_datetime - day_start).total_seconds() / 60,
+            (block.end_datetime - day_start).total_seconds() / 60,
+        )
+        for block in blocks
+    ]
 
 
 def get_available_time_slots(doctor, date):
@@ -950,8 +1152,6 @@ def get_available_time_slots(doctor, date):
     if not date:
         return []
     
-    from datetime import time as dt_time
-    
     # Parse the date if it's a string
     if isinstance(date, str):
         try:
@@ -962,8 +1162,7 @@ def get_available_time_slots(doctor, date):
         date_obj = date
     
     # Get the day of week for the requested date
-    day_names = ['monday', 'tuesday', 'wednesday', 'thursday', 'friday', 'saturday', 'sunday']
-    day_of_week = day_names[date_obj.weekday()]
+    day_of_week = DAY_NAMES[date_obj.weekday()]
     
     # Try to get doctor's schedule for this day
     try:
@@ -978,38 +1177,26 @@ def get_available_time_slots(doctor, date):
         slot_duration = 30  # default 30 minutes
     
     # Check for time blocks (vacations, etc.)
-    time_blocks = TimeBlock.objects.filter(
-        doctor=doctor,
-        start_datetime__date__lte=date_obj,
-        end_datetime__date__gte=date_obj
-    )
+    blocked = get_blocked_ranges(doctor, date_obj)
     
-    # Get already booked slots
-    booked_slots = Appointment.objects.filter(
+    # Get already booked slots as a set for O(1) lookups
+    booked_slots = set(Appointment.objects.filter(
         doctor=doctor,
         appointment_date=date_obj,
-        status__in=['pending', 'approved', 'scheduled']
-    ).values_list('appointment_time', flat=True)
+        status__in=ACTIVE_STATUSES
+    ).values_list('appointment_time', flat=True))
     
-    # Generate available slots
+    # Generate available slots, working in minutes since midnight like
+    # DoctorSchedule.get_time_slots
+    start_min = start_time.hour * 60 + start_time.minute
+    end_min = end_time.hour * 60 + end_time.minute
     available_slots = []
-    current_dt = datetime.combine(date_obj, start_time)
-    end_dt = datetime.combine(date_obj, end_time)
-    
-    while current_dt + timedelta(minutes=slot_duration) <= end_dt:
-        current_time = current_dt.time()
-        is_blocked = False
-        
-        # Check if slot is in a time block
-        for block in time_blocks:
-            if block.start_datetime <= current_dt < block.end_datetime:
-                is_blocked = True
-                break
-        
-        if not is_blocked and current_time not in booked_slots:
-            available_slots.append(current_time.strftime('%H:%M'))
-        
-        current_dt += timedelta(minutes=slot_duration)
+    for minute in range(start_min, end_min - slot_duration + 1, slot_duration):
+        if any(start <= minute < end for start, end in blocked):
+            continue
+        slot = dt_time(minute // 60, minute % 60)
+        if slot not in booked_slots:
+            available_slots.append(slot.strftime('%H:%M'))
     
     return available_slots
 
@@ -1018,25 +1205,29 @@ def activate_account(request, uidb64, token):
     """Activate a user account after email verification."""
     try:
         uid = force_str(urlsafe_base64_decode(uidb64))
-        user = User.objects.get(pk=uid)
+        # Signup already created the profile; load it with the user
+        user = User.objects.select_related('profile').get(pk=uid)
     except (User.DoesNotExist, TypeError, ValueError, OverflowError):
         user = None
 
     if user and default_token_generator.check_token(user, token):
         if not user.is_active:
             user.is_active = True
-            user.save()
+            user.save(update_fields=['is_active'])
 
-        profile, _ = Profile.objects.get_or_create(user=user)
+        try:
+            profile = user.profile
+        except Profile.DoesNotExist:
+            profile = Profile.objects.create(user=user)
         if not profile.email_verified:
             profile.email_verified = True
-            profile.save()
+            profile.save(update_fields=['email_verified', 'updated_at'])
 
         if profile.role == 'doctor':
-            Doctor.objects.filter(name=user.username).update(email_verified=True)
+            Doctor.objects.filter(user=user).update(email_verified=True)
 
         messages.success(request, "Email verified successfully. You are now signed in.")
-        login(request, user)
+        login(request, user, backend='appointment.backends.ProfileModelBackend')
         return redirect('home')
 
     messages.error(request, "Activation link is invalid or has expired.")
@@ -1055,28 +1246,28 @@ def signup_patient(request):
             messages.error(request, "Username, password, and email are required for verification.")
             return redirect('signup_patient')
 
-        if User.objects.filter(username=username).exists():
+        conflict = get_signup_conflict(username, email)
+        if conflict == 'username':
             messages.error(request, "Username already exists.")
             return redirect('signup_patient')
 
-        if User.objects.filter(email=email).exists():
+        if conflict == 'email':
             messages.error(request, "An account with that email already exists.")
             return redirect('signup_patient')
 
         user = User.objects.create_user(
             username=username,
             password=password,
-            email=email
+            email=email,
+            is_active=False
         )
-        user.is_active = False
-        user.save()
 
         # Create profile with enhanced fields
         profile, created = Profile.objects.get_or_create(user=user)
         profile.role = 'patient'
         profile.phone = phone
         profile.email_verified = False
-        profile.save()
+        profile.save(update_fields=['role', 'phone', 'email_verified', 'updated_at'])
 
         send_activation_email(request, user)
 
@@ -1086,15 +1277,7 @@ def signup_patient(request):
         )
         return redirect('login')
 
-    # Get unread notifications count (0 for non-authenticated users)
-    unread_notifications = 0
-    if request.user.is_authenticated:
-        unread_notifications = request.user.notifications.filter(is_read=False).count()
-
-    context = {
-        'unread_notifications': unread_notifications,
-    }
-    return render(request, 'signup_patient.html', context)
+    return render(request, 'signup_patient.html')
 
 
 # ---------------- DOCTOR SIGNUP ----------------
@@ -1128,71 +1311,78 @@ def signup_doctor(request):
             messages.error(request, "You must accept the terms and conditions.")
             return redirect('signup_doctor')
 
-        if User.objects.filter(username=username).exists():
+        conflict = get_signup_conflict(username, email)
+        if conflict == 'username':
             messages.error(request, "Username already exists.")
             return redirect('signup_doctor')
 
-        if User.objects.filter(email=email).exists():
+        if conflict == 'email':
             messages.error(request, "Email already exists.")
             return redirect('signup_doctor')
 
         try:
-            # Create user
-            user = User.objects.create_user(
-                username=username,
-                password=password,
-                email=email
-            )
-            # For development: set user as active immediately
-            # In production, set to False and require email verification
-            user.is_active = True  # Changed from False for easier development
-            user.save()
-
-            # Create profile
-            profile, _ = Profile.objects.get_or_create(user=user)
-            profile.role = 'doctor'
-            profile.specialization = specialization
-            profile.phone = phone
-            profile.email_verified = True  # Mark as verified for development
-            profile.save()
-
-            # Create doctor record with user link
-            doctor = Doctor.objects.create(
-                user=user,  # Link to user account
-                name=username,
-                specialization=specialization,
-                email=email,
-                phone=phone,
-                consultation_fee=float(consultation_fee) if consultation_fee else 0,
-                experience_years=int(experience_years) if experience_years else 0,
-                description=description,
-                affiliation=affiliation,
-                license_number=license_number,
-                email_notifications=email_notifications,
-                sms_notifications=sms_notifications,
-                is_active=True  # Changed from False for easier development
-            )
+            # One transaction for the whole chain, so a failure part-way
+            # leaves no user, profile or doctor behind
+            with transaction.atomic():
+                # Create user
+                # For development: the user is active immediately (the
+                # create_user default). In production, pass is_active=False
+                # and require email verification
+                user = User.objects.create_user(
+                    username=username,
+                    password=password,
+                    email=email
+                )
 
-            # Create default schedule for weekdays
-            default_schedule = [
-                ('monday', '09:00', '17:00'),
-                ('tuesday', '09:00', '17:00'),
-                ('wednesday', '09:00', '17:00'),
-                ('thursday', '09:00', '17:00'),
-                ('friday', '09:00', '17:00'),
-                ('saturday', '10:00', '14:00'),
-            ]
-            for day, start, end in default_schedule:
-                DoctorSchedule.objects.create(
-                    doctor=doctor,
-                    day_of_week=day,
-                    start_time=start,
-                    end_time=end,
-                    is_available=True,
-                    max_appointments=8,
-                    slot_duration=30
+                # Create profile
+                profile, _ = Profile.objects.get_or_create(user=user)
+                profile.role = 'doctor'
+                profile.specialization = specialization
+                profile.phone = phone
+                profile.email_verified = True  # Mark as verified for development
+                profile.save(update_fields=[
+                    'role', 'specialization', 'phone', 'email_verified', 'updated_at'
+                ])
+
+                # Create doctor record with user link
+                doctor = Doctor.objects.create(
+                    user=user,  # Link to user account
+                    name=username,
+                    specialization=specialization,
+                    email=email,
+                    phone=phone,
+                    consultation_fee=float(consultation_fee) if consultation_fee else 0,
+                    experience_years=int(experience_years) if experience_years else 0,
+                    description=description,
+                    affiliation=affiliation,
+                    license_number=license_number,
+                    email_notifications=email_notifications,
+                    sms_notifications=sms_notifications,
+                    is_active=True  # Changed from False for easier development
                 )
 
+                # Create default schedule for weekdays in one INSERT
+                default_schedule = [
+                    ('monday', '09:00', '17:00'),
+                    ('tuesday', '09:00', '17:00'),
+                    ('wednesday', '09:00', '17:00'),
+                    ('thursday', '09:00', '17:00'),
+                    ('friday', '09:00', '17:00'),
+                    ('saturday', '10:00', '14:00'),
+                ]
+                DoctorSchedule.objects.bulk_create([
+                    DoctorSchedule(
+                        doctor=doctor,
+                        day_of_week=day,
+                        start_time=start,
+                        end_time=end,
+                        is_available=True,
+                        max_appointments=8,
+                        slot_duration=30
+                    )
+                    for day, start, end in default_schedule
+                ])
+
             # Skip activation email for development (account is already active)
             # send_activation_email(request, user)
 
@@ -1205,23 +1395,10 @@ def signup_doctor(request):
             return redirect('login')
 
         except Exception as e:
-            # Clean up if there was an error
-            if 'user' in locals():
-                user.delete()
-            if 'doctor' in locals():
-                doctor.delete()
             messages.error(request, f"An error occurred: {str(e)}. Please try again.")
             return redirect('signup_doctor')
 
-    # Get unread notifications count (0 for non-authenticated users)
-    unread_notifications = 0
-    if request.user.is_authenticated:
-        unread_notifications = request.user.notifications.filter(is_read=False).count()
-
-    context = {
-        'unread_notifications': unread_notifications,
-    }
-    return render(request, 'signup_doctor.html', context)
+    return render(request, 'signup_doctor.html')
 
 
 # ================= NEW FEATURES =================
@@ -1232,49 +1409,38 @@ def doctor_detail(request, doctor_id):
     """Doctor detail page with reviews"""
     doctor = get_object_or_404(Doctor, id=doctor_id, is_active=True)
     
-    # Get approved reviews
-    reviews = Review.objects.filter(doctor=doctor, is_approved=True).order_by('-created_at')
+    # Get approved reviews (the template shows each reviewer's username)
+    reviews = Review.objects.filter(doctor=doctor, is_approved=True)
     
-    # Calculate rating distribution
-    rating_distribution = {}
-    for i in range(1, 6):
-        rating_distribution[i] = reviews.filter(rating=i).count()
+    # Calculate rating distribution with one GROUP BY
+    counts = dict(reviews.order_by().values_list('rating').annotate(c=Count('id')))
+    rating_distribution = {i: counts.get(i, 0) for i in range(1, 6)}
+    reviews = reviews.select_related('patient').order_by('-created_at')
     
     # Check if current user can review (has completed appointment)
     can_review = False
-    user_review = None
     if request.user.is_authenticated:
         try:
             profile = request.user.profile
             if profile.role == 'patient':
-                # Check for completed appointments
-                completed_appointments = Appointment.objects.filter(
+                # One query for both checks: None means no completed
+                # appointment, otherwise whether the user already reviewed
+                already_reviewed = Appointment.objects.filter(
                     user=request.user,
                     doctor=doctor,
                     status='completed'
-                )
-                if completed_appointments.exists():
-                    # Check if user already reviewed this doctor
-                    user_review = Review.objects.filter(
-                        doctor=doctor,
-                        patient=request.user
-                    ).first()
-                    can_review = True if not user_review else False
+                ).annotate(reviewed=Exists(
+                    Review.objects.filter(doctor=doctor, patient=request.user)
+                )).values_list('reviewed', flat=True).first()
+                can_review = already_reviewed is False
         except Profile.DoesNotExist:
             pass
     
-    # Get unread notifications count
-    unread_notifications = 0
-    if request.user.is_authenticated:
-        unread_notifications = request.user.notifications.filter(is_read=False).count()
-    
     context = {
         'doctor': doctor,
-        'reviews': reviews[:10],  # Show latest 10 reviews
+        'reviews': reviews[:REVIEWS_PAGE_SIZE],  # Show the latest reviews
         'rating_distribution': rating_distribution,
         'can_review': can_review,
-        'user_review': user_review,
-        'unread_notifications': unread_notifications,
     }
     return render(request, 'doctor_detail.html', context)
 
@@ -1294,19 +1460,19 @@ def add_review(request, doctor_id):
     except Profile.DoesNotExist:
         return JsonResponse({'error': 'Profile not found'}, status=404)
     
-    # Check if user has completed appointment with this doctor
-    completed_appointments = Appointment.objects.filter(
+    # Check if user has completed appointment with this doctor; the id is
+    # all the review needs, so no Appointment is loaded
+    completed_appointment_id = Appointment.objects.filter(
         user=request.user,
         doctor=doctor,
         status='completed'
-    )
+    ).values_list('id', flat=True).first()
     
-    if not completed_appointments.exists():
+    if completed_appointment_id is None:
         return JsonResponse({'error': 'You must have a completed appointment to review this doctor'}, status=400)
     
     # Check if user already reviewed
-    existing_review = Review.objects.filter(doctor=doctor, patient=request.user).first()
-    if existing_review:
+    if Review.objects.filter(doctor=doctor, patient=request.user).exists():
         return JsonResponse({'error': 'You have already reviewed this doctor'}, status=400)
     
     rating = request.POST.get('rating')
@@ -1323,16 +1489,13 @@ def add_review(request, doctor_id):
         review = Review.objects.create(
             doctor=doctor,
             patient=request.user,
-            appointment=completed_appointments.first(),
+            appointment_id=completed_appointment_id,
             rating=int(rating),
             title=title,
             comment=comment,
             is_approved=False  # Require approval
         )
         
-        # Update doctor rating
-        doctor.update_rating()
-        
         return JsonResponse({
             'success': True,
             'message': 'Review submitted successfully! It will be visible after approval.'
@@ -1352,14 +1515,15 @@ def my_reviews(request):
         messages.error(request, "User profile not found.")
         return redirect('home')
     
-    reviews = Review.objects.filter(patient=request.user).order_by('-created_at')
-    
-    # Get unread notifications count
-    unread_notifications = request.user.notifications.filter(is_read=False).count()
+    # The template shows each review's doctor name and specialization
+    reviews = Review.objects.filter(patient=request.user).select_related(
+        'doctor'
+    ).order_by('-created_at')
+    page_obj = Paginator(reviews, REVIEWS_PAGE_SIZE).get_page(request.GET.get('page'))
     
     context = {
-        'reviews': reviews,
-        'unread_notifications': unread_notifications,
+        'reviews': page_obj,
+        'page_obj': page_obj,
     }
     return render(request, 'my_reviews.html', context)
 
@@ -1386,20 +1550,13 @@ def edit_review(request, review_id):
         review.title = title
         review.comment = comment
         review.is_approved = False  # Require re-approval after edit
-        review.save()
-        
-        # Update doctor rating
-        review.doctor.update_rating()
+        review.save(update_fields=['rating', 'title', 'comment', 'is_approved', 'updated_at'])
         
         messages.success(request, 'Review updated successfully!')
         return redirect('my_reviews')
     
-    # Get unread notifications count
-    unread_notifications = request.user.notifications.filter(is_read=False).count()
-    
     context = {
         'review': review,
-        'unread_notifications': unread_notifications,
     }
     return render(request, 'edit_review.html', context)
 
@@ -1425,12 +1582,8 @@ def appointment_calendar(request):
     else:
         appointments = Appointment.objects.all()
     
-    # Get unread notifications count
-    unread_notifications = request.user.notifications.filter(is_read=False).count()
-    
     context = {
         'appointments': appointments,
-        'unread_notifications': unread_notifications,
         'role': profile.role,
     }
     return render(request, 'calendar.html', context)
@@ -1454,34 +1607,26 @@ def calendar_events(request):
     else:
         appointments = Appointment.objects.all()
     
-    # Format for FullCalendar
-    events = []
-    for apt in appointments:
-        # Color based on status
-        status_colors = {
-            'pending': '#f59e0b',
-            'approved': '#3b82f6',
-            'scheduled': '#10b981',
-            'completed': '#6b7280',
-            'cancelled': '#ef4444',
-            'rescheduled': '#8b5cf6',
-            'no_show': '#f97316',
-            'rejected': '#dc2626',
+    # Only the serialized columns, as dicts; doctor__name is a JOIN rather
+    # than one doctor query per event
+    appointments = appointments.values(
+        'id', 'status', 'appointment_date', 'appointment_time', 'patient_name',
+        'reason', 'doctor__name',
+    )
+
+    # Format for FullCalendar, colored by status
+    events = [{
+        'id': apt['id'],
+        'title': f"{apt['patient_name']} - {apt['status']}",
+        'start': f"{apt['appointment_date']}T{apt['appointment_time']}",
+        'color': STATUS_COLORS.get(apt['status'], '#6b7280'),
+        'extendedProps': {
+            'status': apt['status'],
+            'patient_name': apt['patient_name'],
+            'reason': apt['reason'][:100] if apt['reason'] else '',
+            'doctor_name': apt['doctor__name'],
         }
-        color = status_colors.get(apt.status, '#6b7280')
-        
-        events.append({
-            'id': apt.id,
-            'title': f"{apt.patient_name} - {apt.status}",
-            'start': f"{apt.appointment_date}T{apt.appointment_time}",
-            'color': color,
-            'extendedProps': {
-                'status': apt.status,
-                'patient_name': apt.patient_name,
-                'reason': apt.reason[:100] if apt.reason else '',
-                'doctor_name': apt.doctor.name,
-            }
-        })
+    } for apt in appointments]
     
     return JsonResponse(events, safe=False)
 
@@ -1537,7 +1682,9 @@ def manage_availability(request):
                 schedule.is_available = request.POST.get(f'available_{day}') == 'on'
                 schedule.max_appointments = int(request.POST.get(f'max_{day}', 8))
                 schedule.slot_duration = int(request.POST.get(f'duration_{day}', 30))
-                schedule.save()
+                schedule.save(update_fields=[
+                    'start_time', 'end_time', 'is_available', 'max_appointments', 'slot_duration'
+                ])
             messages.success(request, 'Schedule updated successfully!')
             
         elif action == 'add_block':
@@ -1569,15 +1716,11 @@ def manage_availability(request):
         
         return redirect('manage_availability')
     
-    # Get unread notifications count
-    unread_notifications = request.user.notifications.filter(is_read=False).count()
-    
     context = {
         'doctor': doctor,
         'schedules': schedules,
         'time_blocks': time_blocks,
         'days': days,
-        'unread_notifications': unread_notifications,
     }
     return render(request, 'availability.html', context)
 
@@ -1594,83 +1737,49 @@ def get_available_slots_v2(request):
     if not doctor_id or not date:
         return JsonResponse({'error': 'Doctor ID and date are required'}, status=400)
     
-    try:
-        doctor = Doctor.objects.get(id=doctor_id)
-    except Doctor.DoesNotExist:
-        return JsonResponse({'error': 'Doctor not found'}, status=404)
-    
     # Get day of week
     try:
         date_obj = datetime.strptime(date, '%Y-%m-%d').date()
-        day_of_week = date_obj.strftime('%monday').lower()
-        if 'monday' in day_of_week:
-            day_of_week = 'monday'
-        elif 'tuesday' in day_of_week:
-            day_of_week = 'tuesday'
-        elif 'wednesday' in day_of_week:
-            day_of_week = 'wednesday'
-        elif 'thursday' in day_of_week:
-            day_of_week = 'thursday'
-        elif 'friday' in day_of_week:
-            day_of_week = 'friday'
-        elif 'saturday' in day_of_week:
-            day_of_week = 'saturday'
-        else:
-            day_of_week = 'sunday'
-    except:
+    except ValueError:
         return JsonResponse({'error': 'Invalid date format'}, status=400)
-    
-    # Get schedule for this day
-    try:
-        schedule = DoctorSchedule.objects.get(doctor=doctor, day_of_week=day_of_week)
-        if not schedule.is_available:
-            return JsonResponse({'slots': [], 'message': 'Doctor not available on this day'})
-    except DoctorSchedule.DoesNotExist:
+    day_of_week = DAY_NAMES[date_obj.weekday()]
+    
+    # Get schedule for this day; the doctor itself is only looked up
+    # when there is no schedule row to tell a missing doctor apart
+    schedule = DoctorSchedule.objects.filter(
+        doctor_id=doctor_id, day_of_week=day_of_week
+    ).first()
+    if schedule is None:
+        if not Doctor.objects.filter(id=doctor_id).exists():
+            return JsonResponse({'error': 'Doctor not found'}, status=404)
         return JsonResponse({'slots': [], 'message': 'No schedule configured for this day'})
+    if not schedule.is_available:
+        return JsonResponse({'slots': [], 'message': 'Doctor not available on this day'})
+    
+    # Get booked appointments as a set of minutes since midnight for O(1) lookups
+    booked_minutes = {
+        booked.hour * 60 + booked.minute
+        for booked in Appointment.objects.filter(
+            doctor_id=schedule.doctor_id,
+            appointment_date=date_obj,
+            status__in=ACTIVE_STATUSES
+        ).values_list('appointment_time', flat=True)
+    }
     
-    # Get booked appointments
-    booked_slots = Appointment.objects.filter(
-        doctor=doctor,
-        appointment_date=date,
-        status__in=['pending', 'approved', 'scheduled']
-    ).values_list('appointment_time', flat=True)
+    # Get time blocks as minute ranges, converted once rather than per slot
+    blocked = get_blocked_ranges(schedule.doctor_id, date_obj)
     
-    # Get time blocks
-    date_start = timezone.make_aware(datetime.strptime(f"{date} 00:00", "%Y-%m-%d %H:%M"))
-    date_end = timezone.make_aware(datetime.strptime(f"{date} 23:59", "%Y-%m-%d %H:%M"))
-    blocks = TimeBlock.objects.filter(
-        doctor=doctor,
-        start_datetime__lte=date_end,
-        end_datetime__gte=date_start
-    )
-    
-    # Generate available slots
+    # Generate available slots on the integer minute grid; no time objects
+    # are built for the slots that get skipped
     slots = []
-    current_time = datetime.combine(datetime.today(), schedule.start_time)
-    end_time = datetime.combine(datetime.today(), schedule.end_time)
-    
-    while current_time + timedelta(minutes=schedule.slot_duration) <= end_time:
-        slot_time = current_time.time()
-        slot_str = slot_time.strftime('%H:%M')
-        
-        # Check if booked
-        if slot_time not in booked_slots:
-            # Check if blocked
-            is_blocked = False
-            for block in blocks:
-                block_start = block.start_datetime.time()
-                block_end = block.end_datetime.time()
-                if block_start <= slot_time < block_end:
-                    is_blocked = True
-                    break
-            
-            if not is_blocked:
-                slots.append({
-                    'time': slot_str,
-                    'display': slot_str
-                })
-        
-        current_time += timedelta(minutes=schedule.slot_duration)
+    for minute in schedule.get_slot_minutes():
+        if minute in booked_minutes or any(start <= minute < end for start, end in blocked):
+            continue
+        slot_str = f'{minute // 60:02d}:{minute % 60:02d}'
+        slots.append({
+            'time': slot_str,
+            'display': slot_str
+        })
     
     return JsonResponse({'slots': slots})
 
@@ -1691,30 +1800,13 @@ def manage_reminders(request):
         if not doctor:
             messages.error(request, "Doctor profile not found.")
             return redirect('home')
-        appointments = Appointment.objects.filter(
-            doctor=doctor,
-            appointment_date__gte=timezone.now().date(),
-            status__in=['pending', 'approved', 'scheduled']
-        ).order_by('appointment_date', 'appointment_time')
+        owned = Appointment.objects.filter(doctor=doctor)
     else:
-        appointments = Appointment.objects.filter(
-            user=request.user,
-            appointment_date__gte=timezone.now().date(),
-            status__in=['pending', 'approved', 'scheduled']
-        ).order_by('appointment_date', 'appointment_time')
-    
-    # Get all reminders for these appointments
-    appointment_ids = appointments.values_list('id', flat=True)
-    reminders = AppointmentReminder.objects.filter(
-        appointment_id__in=appointment_ids
-    ).select_related('appointment')
-    
-    # Group reminders by appointment
-    reminders_dict = {}
-    for reminder in reminders:
-        if reminder.appointment_id not in reminders_dict:
-            reminders_dict[reminder.appointment_id] = []
-        reminders_dict[reminder.appointment_id].append(reminder)
+        owned = Appointment.objects.filter(user=request.user)
+    appointments = owned.filter(
+        appointment_date__gte=timezone.now().date(),
+        status__in=ACTIVE_STATUSES
+    ).order_by('appointment_date', 'appointment_time')
     
     if request.method == 'POST':
         action = request.POST.get('action')
@@ -1722,84 +1814,55 @@ def manage_reminders(request):
         if action == 'add_reminder':
             appointment_id = request.POST.get('appointment_id')
             reminder_type = request.POST.get('reminder_type', 'email')
-            hours_before = float(request.POST.get('hours_before', 24))
+            # Several reminder times may be picked at once
+            hours_list = sorted(
+                {float(hours) for hours in request.POST.getlist('hours_before')} or {24.0},
+                reverse=True,
+            )
             
-            appointment = get_object_or_404(Appointment, id=appointment_id)
+            appointment = get_object_or_404(owned, id=appointment_id)
             
-            # Calculate scheduled time
-            appointment_datetime = timezone.make_aware(
-                datetime.combine(appointment.appointment_date, appointment.appointment_time)
-            )
-            scheduled_for = appointment_datetime - timedelta(hours=hours_before)
+            # Calculate scheduled time from the stored appointment_at column
+            appointment_datetime = appointment.appointment_at
             
-            # Create reminder
-            AppointmentReminder.objects.create(
-                appointment=appointment,
-                reminder_type=reminder_type,
-                hours_before=hours_before,
-                scheduled_for=scheduled_for
-            )
-            messages.success(request, 'Reminder added successfully!')
+            # Create the reminders with one INSERT
+            AppointmentReminder.objects.bulk_create([
+                AppointmentReminder(
+                    appointment=appointment,
+                    reminder_type=reminder_type,
+                    hours_before=hours_before,
+                    scheduled_for=appointment_datetime - timedelta(hours=hours_before)
+                )
+                for hours_before in hours_list
+            ])
+            if len(hours_list) > 1:
+                messages.success(request, f'{len(hours_list)} reminders added successfully!')
+            else:
+                messages.success(request, 'Reminder added successfully!')
         
         elif action == 'delete_reminder':
             reminder_id = request.POST.get('reminder_id')
-            AppointmentReminder.objects.filter(id=reminder_id).delete()
+            # Reminders have no delete signals or dependent rows, so this is
+            # a single DELETE, limited to the user's own appointments
+            AppointmentReminder.objects.filter(id=reminder_id, appointment__in=owned).delete()
             messages.success(request, 'Reminder removed.')
         
         return redirect('manage_reminders')
     
-    # Get unread notifications count
-    unread_notifications = request.user.notifications.filter(is_read=False).count()
-    
+    # Each appointment's reminders come in one extra query; the doctor
+    # shown on each card is joined in
     context = {
-        'appointments': appointments,
-        'reminders_dict': reminders_dict,
+        'appointments': appointments.select_related('doctor').prefetch_related('reminders'),
         'reminder_choices': AppointmentReminder.REMINDER_TIMES,
-        'unread_notifications': unread_notifications,
     }
     return render(request, 'reminders.html', context)
 
 
 # ---------------- API: SEND REMINDERS (Command) ----------------
 def send_pending_reminders():
-    """Send all pending reminders that are due"""
-    now = timezone.now()
-    
-    # Get pending reminders that are due
-    reminders = AppointmentReminder.objects.filter(
-        is_sent=False,
-        scheduled_for__lte=now
-    ).select_related('appointment')
-    
-    for reminder in reminders:
-        appointment = reminder.appointment
-        
-        # Send email reminder
-        if reminder.reminder_type in ['email', 'both']:
-            try:
-                subject = f"Appointment Reminder - {appointment.doctor.name}"
-                message = f"""
-                This is a reminder for your upcoming appointment:
-                
-                Doctor: {appointment.doctor.name}
-                Date: {appointment.appointment_date}
-                Time: {appointment.appointment_time}
-                
-                Please arrive 15 minutes early.
-                """
-                send_mail(
-                    subject=subject,
-                    message=message,
-                    from_email='noreply@doctorportal.com',
-                    recipient_list=[appointment.patient_email],
-                    fail_silently=True,
-                )
-                reminder.is_sent = True
-                reminder.sent_at = now
-                reminder.sent_via = 'email'
-                reminder.save()
-            except Exception as e:
-                reminder.error_message = str(e)
-                reminder.save()
-    
-    return reminders.count()
+    """
+    Send all pending reminders that are due. Delegates to the batched task
+    and returns the number of reminders sent.
+    """
+    sent, failed = send_due_reminders()
+    return len(sent)
@@ -52,6 +52,7 @@ MIDDLEWARE = [
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
+    'appointment.middleware.ProfileMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
 ]
@@ -62,12 +63,19 @@ TEMPLATES = [
     {
         'BACKEND': 'django.template.backends.django.DjangoTemplates',
         'DIRS': [],
-        'APP_DIRS': True,
         'OPTIONS': {
             'context_processors': [
                 'django.template.context_processors.request',
                 'django.contrib.auth.context_processors.auth',
                 'django.contrib.messages.context_processors.messages',
+                'appointment.context_processors.notifications',
+            ],
+            # Parse each template once per process (page and email templates alike)
+            'loaders': [
+                ('django.template.loaders.cached.Loader', [
+                    'django.template.loaders.filesystem.Loader',
+                    'django.template.loaders.app_directories.Loader',
+                ]),
             ],
         },
     },
@@ -79,10 +87,41 @@ WSGI_APPLICATION = 'project.wsgi.application'
 # Database
 # https://docs.djangoproject.com/en/6.0/ref/settings/#databases
 
+# Keep connections open between requests; set DJANGO_CONN_MAX_AGE=none when a
+# transaction-mode pooler such as PgBouncer sits in front of the database.
+# Such a pooler also breaks the server-side cursors that .iterator() uses on
+# PostgreSQL (the exports and send_pending_reminders), so set
+# DJANGO_DISABLE_SERVER_SIDE_CURSORS=true behind it as well.
+_conn_max_age = os.environ.get('DJANGO_CONN_MAX_AGE', '60')
+
 DATABASES = {
     'default': {
         'ENGINE': 'django.db.backends.sqlite3',
         'NAME': BASE_DIR / 'db.sqlite3',
+        'CONN_MAX_AGE': None if _conn_max_age.lower() == 'none' else int(_conn_max_age),
+        'CONN_HEALTH_CHECKS': True,
+        'DISABLE_SERVER_SIDE_CURSORS': os.environ.get(
+            'DJANGO_DISABLE_SERVER_SIDE_CURSORS', 'False'
+        ).lower() in ('true', '1', 'yes'),
+    }
+}
+
+
+# Cache
+# https://docs.djangoproject.com/en/6.0/topics/cache/
+
+# The default local-memory cache is per process, so each worker would keep its
+# own copy of the unread-notification counts and listing caches and miss the
+# invalidations done by the others. A file cache is shared by every worker on
+# the host; point DJANGO_CACHE_DIR at shared storage when running several hosts.
+# FileBasedCache unpickles what it reads, so the directory must be writable
+# only by the user the site runs as. Django creates it with mode 0700; a
+# directory that already exists keeps its own mode, so check it, and never
+# point this at a shared location such as /tmp.
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+        'LOCATION': os.environ.get('DJANGO_CACHE_DIR', BASE_DIR / 'cache'),
     }
 }
 
@@ -132,6 +171,14 @@ MEDIA_ROOT = BASE_DIR / 'media'
 # Default primary key field type
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 
+# Load the profile and doctor link with the session user; the stock backend
+# stays listed so sessions created before the switch remain valid until
+# ProfileMiddleware moves them over
+AUTHENTICATION_BACKENDS = [
+    'appointment.backends.ProfileModelBackend',
+    'django.contrib.auth.backends.ModelBackend',
+]
+
 LOGIN_URL = '/login/'
 LOGIN_REDIRECT_URL = '/'
 # LOGOUT_REDIRECT_URL = '/login/'
@@ -146,3 +193,21 @@ LOGIN_REDIRECT_URL = '/'
 # EMAIL_HOST_PASSWORD = os.environ.get('EMAIL_HOST_PASSWORD', '')
 EMAIL_BACKEND = 'django.core.mail.backends.console.EmailBackend'
 DEFAULT_FROM_EMAIL = os.environ.get('DEFAULT_FROM_EMAIL', 'noreply@doctorportal.local')
+
+# Logging
+# https://docs.djangoproject.com/en/6.0/topics/logging/
+LOGGING = {
+    'version': 1,
+    'disable_existing_loggers': False,
+    'handlers': {
+        'console': {
+            'class': 'logging.StreamHandler',
+        },
+    },
+    'loggers': {
+        'appointment': {
+            'handlers': ['console'],
+            'level': os.environ.get('APPOINTMENT_LOG_LEVEL', 'INFO'),
+        },
+    },
+}